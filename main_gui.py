@@ -1,10 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
+import queue
 import os
 import sys
 from pathlib import Path
-from src.laptop_repair.crew import LaptopRepairCrew
+from src.laptop_repair.cancellation import CancellationToken, DiagnosisCancelled
+from src.laptop_repair.report import split_report
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
@@ -24,7 +26,16 @@ class WindowsSystemDiagnosticGUI:
         self.submitted_problem = ""
         self.show_script_permission = False
         self.user_approved_script = False
+        # Progress events of the current run's worker threads, drained on the Tk thread.
+        # Every run gets a new queue, so a cancelled run that is still winding down cannot
+        # write into the next run's results.
+        self.event_queue = queue.Queue()
+        self.streaming = False
+        self.cancel_token = None
         self.setup_ui()
+        # crewai/litellm are loaded in the background once the window is up
+        self.warmup_started = False
+        self.root.bind("<Map>", self.start_warmup, add="+")
         
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="10")
@@ -61,8 +72,19 @@ Describe the issue you're facing, provide your Gemini API key, and I'll investig
         self.problem_text = scrolledtext.ScrolledText(input_frame, height=4, width=50)
         self.problem_text.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=(5, 10), padx=(10, 0))
         
-        self.diagnose_btn = ttk.Button(input_frame, text="🔍 Diagnose My System", command=self.start_diagnosis)
-        self.diagnose_btn.grid(row=2, column=1, pady=(0, 5), padx=(10, 0), sticky=tk.W)
+        actions_frame = ttk.Frame(input_frame)
+        actions_frame.grid(row=2, column=1, pady=(0, 5), padx=(10, 0), sticky=tk.W)
+
+        self.diagnose_btn = ttk.Button(actions_frame, text="🔍 Diagnose My System", command=self.start_diagnosis)
+        self.diagnose_btn.grid(row=0, column=0, sticky=tk.W)
+
+        self.cancel_btn = ttk.Button(actions_frame, text="⛔ Cancel", command=self.cancel_diagnosis, state=tk.DISABLED)
+        self.cancel_btn.grid(row=0, column=1, padx=(10, 0), sticky=tk.W)
+
+        # Off by default: prefetching runs the common diagnostics whether or not the agent needs them
+        self.prefetch_var = tk.BooleanVar(value=False)
+        self.prefetch_check = ttk.Checkbutton(actions_frame, text="Prefetch common diagnostics", variable=self.prefetch_var)
+        self.prefetch_check.grid(row=0, column=2, padx=(20, 0), sticky=tk.W)
         
         self.progress_var = tk.StringVar(value="Ready to diagnose...")
         self.progress_label = ttk.Label(input_frame, textvariable=self.progress_var)
@@ -158,49 +180,118 @@ Before you proceed:
         os.environ["GEMINI_API_KEY"] = api_key
         self.submitted_problem = problem
         self.diagnose_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
         self.progress_var.set("The diagnostic agents are investigating... This may take a moment.")
         self.progress_bar.start()
-        thread = threading.Thread(target=self.run_diagnosis, args=(problem,))
+        self.event_queue = queue.Queue()
+        self.start_streaming()
+        self.cancel_token = CancellationToken()
+        thread = threading.Thread(target=self.run_diagnosis, args=(problem, self.cancel_token, self.event_queue, self.prefetch_var.get()))
         thread.daemon = True
         thread.start()
         
-    def run_diagnosis(self, problem):
+    def cancel_diagnosis(self):
+        if self.cancel_token is not None:
+            self.progress_var.set("Cancelling diagnosis...")
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.cancel_token.cancel()
+
+    def start_warmup(self, event=None):
+        if self.warmup_started:
+            return
+        self.warmup_started = True
+        thread = threading.Thread(target=self.warm_up, name="crew-warmup")
+        thread.daemon = True
+        thread.start()
+
+    def warm_up(self):
         try:
-            repair_crew = LaptopRepairCrew(problem)
-            report = repair_crew.run()
+            import src.laptop_repair.crew  # noqa: F401
+        except Exception:
+            # Surface the real error when the user clicks Diagnose
+            pass
+
+    def run_diagnosis(self, problem, cancel_token, event_queue, prefetch=False):
+        try:
+            # Usually already imported by the warm-up thread; otherwise this waits for it
+            from src.laptop_repair.crew import LaptopRepairCrew
+            repair_crew = LaptopRepairCrew(problem, prefetch=prefetch, stream=True)
+            report = repair_crew.run(on_event=event_queue.put, cancel_token=cancel_token)
             self.root.after(0, self.diagnosis_complete, report)
             
+        except DiagnosisCancelled:
+            self.root.after(0, self.diagnosis_cancelled)
+
         except Exception as e:
             error_msg = f"An error occurred while running the diagnosis: {e}"
             self.root.after(0, self.diagnosis_error, error_msg)
             
+    def start_streaming(self):
+        self.streaming = True
+        self.results_frame.grid()
+        self.problem_label.config(text=f"Investigating: {self.submitted_problem}")
+        self.results_text.config(state=tk.NORMAL)
+        self.results_text.delete("1.0", tk.END)
+        self.results_text.config(state=tk.DISABLED)
+        self.root.after(100, self.poll_events)
+
+    def stop_streaming(self):
+        self.streaming = False
+        self.drain_events()
+
+    def poll_events(self):
+        self.drain_events()
+        if self.streaming:
+            self.root.after(100, self.poll_events)
+
+    def drain_events(self):
+        chunks = []
+        while True:
+            try:
+                event = self.event_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event.kind == "llm_token":
+                chunks.append(event.data.get("text", ""))
+            elif event.kind == "command_started":
+                chunks.append(f"\n▶ Running: {event.data['command']}\n")
+                self.progress_var.set(f"Running: {event.data['command']}")
+            elif event.kind == "command_finished":
+                chunks.append(f"✔ {event.data['command']} ({event.data['elapsed_s']:.2f} s)\n")
+                self.progress_var.set("The diagnostic agents are investigating... This may take a moment.")
+        if chunks:
+            self.results_text.config(state=tk.NORMAL)
+            self.results_text.insert(tk.END, "".join(chunks))
+            self.results_text.see(tk.END)
+            self.results_text.config(state=tk.DISABLED)
+
+    def finish_run(self):
+        self.stop_streaming()
+        self.cancel_token = None
+        self.progress_bar.stop()
+        self.diagnose_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+
+    def diagnosis_cancelled(self):
+        self.finish_run()
+        self.progress_var.set("Diagnosis cancelled.")
+
     def diagnosis_complete(self, report):
+        self.finish_run()
         self.diagnosis_report = report
-        self.progress_bar.stop()
         self.progress_var.set("Diagnosis complete!")
-        self.diagnose_btn.config(state=tk.NORMAL)
         
-        if "--- BATCH SCRIPT START ---" in report:
-            try:
-                diagnosis, script_full = report.split("--- BATCH SCRIPT START ---", 1)
-                script_content = script_full.split("--- BATCH SCRIPT END ---")[0].strip()
-                self.diagnosis_content = diagnosis
-                self.script_content = script_content
-                self.show_script_permission = True
-            except ValueError:
-                self.diagnosis_content = report
-                self.show_script_permission = False
-        else:
-            self.diagnosis_content = report
-            self.show_script_permission = False
+        diagnosis, script_content = split_report(report)
+        self.diagnosis_content = diagnosis
+        self.script_content = script_content
+        self.show_script_permission = bool(script_content)
             
         # Update UI
         self.display_results()
         
     def diagnosis_error(self, error_msg):
-        self.progress_bar.stop()
+        self.finish_run()
         self.progress_var.set("Diagnosis failed!")
-        self.diagnose_btn.config(state=tk.NORMAL)
         messagebox.showerror("Diagnosis Error", error_msg)
         
     def display_results(self):
@@ -276,6 +367,15 @@ Before you proceed:
             except Exception as e:
                 messagebox.showerror("Save Error", f"Failed to save script: {e}")
 
+def report_startup_profile():
+    """Print time-to-window and the cost of the deferred crew imports (--startup-profile)."""
+    from src.laptop_repair.startup_profile import format_startup_report, measure_imports, seconds_since_process_start
+
+    stages = [("window mapped", seconds_since_process_start())]
+    timings = measure_imports()
+    stages.append(("crew stack imported", seconds_since_process_start()))
+    print(format_startup_report(stages, timings))
+
 def main():
     root = tk.Tk()
     app = WindowsSystemDiagnosticGUI(root)
@@ -283,6 +383,10 @@ def main():
     x = (root.winfo_screenwidth() // 2) - (root.winfo_width() // 2)
     y = (root.winfo_screenheight() // 2) - (root.winfo_height() // 2)
     root.geometry(f"+{x}+{y}")
+    if "--startup-profile" in sys.argv:
+        # Measure on the Tk thread before the warm-up thread gets to the imports
+        app.warmup_started = True
+        root.after(0, report_startup_profile)
     root.mainloop()
 
 if __name__ == "__main__":
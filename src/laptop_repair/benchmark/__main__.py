@@ -0,0 +1,69 @@
+"""
+Offline benchmark of the tool and crew pipeline:
+
+    python -m src.laptop_repair.benchmark [--fixtures windows linux] [--save out.json] [--compare baseline.json]
+
+Commands are replayed from recorded fixtures and the LLM is a scripted stand-in,
+so it runs on any OS without network access or an API key.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
+# No telemetry round-trips from crewai during an offline run
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from src.laptop_repair.benchmark.harness import compare_results, format_results, run_scenario
+from src.laptop_repair.benchmark.replay import fixture_names
+from src.laptop_repair.benchmark.scenarios import build_scenarios
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the diagnostic tool and crew pipeline.")
+    parser.add_argument("--fixtures", nargs="+", default=fixture_names(), help="Fixture sets to replay (default: all).")
+    parser.add_argument("-k", "--filter", default="", help="Only run scenarios whose name contains this text.")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed rounds per scenario.")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls before calibration.")
+    parser.add_argument("--no-crew", action="store_true", help="Skip the end-to-end crew scenarios and time only the tool pipeline (crewai is still required).")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON.")
+    parser.add_argument("--compare", metavar="PATH", help="Fail if a median regressed against this saved run.")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed slowdown ratio for --compare (default 0.25).")
+    args = parser.parse_args(argv)
+
+    scenarios = build_scenarios(args.fixtures, include_crew=not args.no_crew)
+    scenarios = [s for s in scenarios if args.filter in s.name]
+
+    results = []
+    for scenario in scenarios:
+        print(f"running {scenario.name} ...", file=sys.stderr)
+        results.append(run_scenario(scenario, rounds=args.rounds, warmup=args.warmup))
+    results.sort(key=lambda r: r.group)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.time(),
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()}",
+                "results": [r.to_dict() for r in results],
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_results(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(f"  {line}" for line in regressions))
+            return 1
+        print(f"\nNo scenario regressed by more than {args.max_regression:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
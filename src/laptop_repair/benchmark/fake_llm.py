@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+from crewai.llms.base_llm import BaseLLM
+
+
+class ScriptedLLM(BaseLLM):
+    """
+    Deterministic stand-in for the Gemini client. It plays back a fixture's script
+    of tool calls in crewai's ReAct text format and then the final answer, so the
+    real agent loop, tool dispatch and output handling run without network access.
+
+    The step is derived from the conversation (one assistant message per finished
+    tool call), so one instance can serve many crews, including concurrent ones.
+    """
+
+    def __init__(self, script: list, tool_name: str):
+        super().__init__(model="scripted/offline-replay")
+        self.script = script
+        self.tool_name = tool_name
+        self.calls = 0
+        # Time spent inside call(); subtracted when measuring crew overhead
+        self.call_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs) -> str:
+        started = time.perf_counter()
+        step = self.script[min(self._step_index(messages), len(self.script) - 1)]
+        if "final_answer" in step:
+            response = f"Thought: I now know the final answer\nFinal Answer: {step['final_answer']}"
+        else:
+            response = (
+                f"Thought: {step['thought']}\n"
+                f"Action: {self.tool_name}\n"
+                f"Action Input: {json.dumps({'command': step['command']})}"
+            )
+        with self._lock:
+            self.calls += 1
+            self.call_seconds += time.perf_counter() - started
+        return response
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = 0
+            self.call_seconds = 0.0
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        return 1_000_000
+
+    @staticmethod
+    def _step_index(messages) -> int:
+        if isinstance(messages, str):
+            return 0
+        return sum(1 for message in messages if message.get("role") == "assistant")
@@ -0,0 +1,145 @@
+import gc
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional
+import psutil
+
+
+@dataclass
+class Scenario:
+    """
+    One benchmark: `func()` performs `ops` operations per call. If it returns a number,
+    that many seconds (e.g. time spent in the stand-in LLM) are excluded from the call.
+    """
+    name: str
+    group: str
+    func: Callable[[], Optional[float]]
+    ops: int = 1
+    # Calls are repeated within a round until it lasts at least this long (timer resolution)
+    min_round_time: float = 0.002
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    rounds: int
+    iterations: int
+    # Seconds per operation
+    min: float
+    max: float
+    mean: float
+    median: float
+    stddev: float
+    # Process high-water mark of resident memory after the scenario
+    peak_rss_bytes: Optional[int] = None
+
+    @property
+    def ops_per_second(self) -> float:
+        return 1.0 / self.median if self.median else float("inf")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Highest resident set size this process has reached so far."""
+    try:
+        import resource
+    except ImportError:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _timed_call(func) -> float:
+    started = time.perf_counter()
+    excluded = func()
+    return time.perf_counter() - started - (excluded or 0.0)
+
+
+def _calibrate(scenario: Scenario) -> int:
+    """Number of calls per round so that a round lasts at least min_round_time."""
+    iterations = 1
+    while True:
+        elapsed = sum(_timed_call(scenario.func) for _ in range(iterations))
+        if elapsed >= scenario.min_round_time or iterations >= 1_000_000:
+            return iterations
+        iterations *= 10 if elapsed < scenario.min_round_time / 10 else 2
+
+
+def run_scenario(scenario: Scenario, rounds: int = 20, warmup: int = 2) -> BenchmarkResult:
+    """Time a scenario pytest-benchmark style: warm up, calibrate, then collect `rounds` samples."""
+    for _ in range(warmup):
+        scenario.func()
+    iterations = _calibrate(scenario)
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            elapsed = sum(_timed_call(scenario.func) for _ in range(iterations))
+            samples.append(elapsed / (iterations * scenario.ops))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return BenchmarkResult(
+        name=scenario.name,
+        group=scenario.group,
+        rounds=rounds,
+        iterations=iterations,
+        min=min(samples),
+        max=max(samples),
+        mean=statistics.fmean(samples),
+        median=statistics.median(samples),
+        stddev=statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        peak_rss_bytes=peak_rss_bytes(),
+    )
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    """Render results as a table grouped like pytest-benchmark's terminal report."""
+    lines = []
+    width = max((len(r.name) for r in results), default=10)
+    header = f"{'name':<{width}} {'min':>10} {'median':>10} {'mean':>10} {'stddev':>10} {'ops/s':>11} {'rounds':>7} {'peak RSS':>9}"
+    current_group = None
+    for result in results:
+        if result.group != current_group:
+            current_group = result.group
+            lines += ["", f"--- {current_group} ---", header]
+        rss = f"{result.peak_rss_bytes / 1024 ** 2:.0f} MiB" if result.peak_rss_bytes else "-"
+        lines.append(
+            f"{result.name:<{width}} {_format_seconds(result.min):>10} {_format_seconds(result.median):>10} "
+            f"{_format_seconds(result.mean):>10} {_format_seconds(result.stddev):>10} "
+            f"{result.ops_per_second:>11,.0f} {result.rounds:>7} {rss:>9}"
+        )
+    return "\n".join(lines).lstrip("\n")
+
+
+def compare_results(results: List[BenchmarkResult], baseline: dict, max_regression: float) -> List[str]:
+    """Return a message for every scenario whose median is more than `max_regression` slower than baseline."""
+    regressions = []
+    previous = {entry["name"]: entry for entry in baseline.get("results", [])}
+    for result in results:
+        entry = previous.get(result.name)
+        if entry is None or not entry["median"]:
+            continue
+        ratio = result.median / entry["median"]
+        if ratio > 1.0 + max_regression:
+            regressions.append(
+                f"{result.name}: median {_format_seconds(result.median)} vs baseline "
+                f"{_format_seconds(entry['median'])} ({(ratio - 1) * 100:+.0f}%)"
+            )
+    return regressions
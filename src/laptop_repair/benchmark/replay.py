@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict
+from pydantic import Field
+from src.laptop_repair.tools.command_cache import normalize_command
+from src.laptop_repair.tools.custom_tool import SystemCommandTool
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Replayed output is fed to the capture in chunks of this size, like the pipe reader does
+_CHUNK_CHARS = 4096
+
+
+def load_fixture(name: str) -> dict:
+    """Load a recorded fixture set by name ('windows', 'linux') or by path."""
+    path = name if os.path.exists(name) else os.path.join(FIXTURES_DIR, f"{name}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fixture_names() -> list:
+    return sorted(name[:-5] for name in os.listdir(FIXTURES_DIR) if name.endswith(".json"))
+
+
+class ReplaySystemCommandTool(SystemCommandTool):
+    """
+    SystemCommandTool whose commands are answered from a recorded fixture instead of
+    a subprocess. Everything around the process — allowlist, caches, capture limits,
+    parsers and formatting — is the real code path.
+    """
+
+    # normalized command -> {"returncode", "stdout", "stderr", "elapsed_s"}
+    recordings: Dict[str, Any] = Field(default_factory=dict, exclude=True)
+    # Shown in the output header instead of the host's release
+    recorded_release: str = ""
+    # Sleep this fraction of each recorded command duration (0 measures pure overhead)
+    latency_scale: float = 0.0
+    # psutil would describe the benchmark host rather than the recorded machine
+    use_native: bool = False
+
+    @classmethod
+    def from_fixture(cls, fixture: dict, **kwargs) -> "ReplaySystemCommandTool":
+        recordings = {normalize_command(cmd): rec for cmd, rec in fixture["commands"].items()}
+        return cls(
+            recordings=recordings,
+            target_platform=fixture["platform"],
+            recorded_release=fixture.get("release", ""),
+            **kwargs,
+        )
+
+    def replay(self, command: str):
+        """Push a recording through capture and formatting, returning (output, cacheable)."""
+        recording = self.recordings.get(normalize_command(command))
+        if recording is None:
+            raise FileNotFoundError(command)
+        stdout = self._new_capture()
+        stderr = self._new_capture()
+        for capture, text in ((stdout, recording["stdout"]), (stderr, recording["stderr"])):
+            for start in range(0, len(text), _CHUNK_CHARS):
+                capture.write(text[start:start + _CHUNK_CHARS])
+            capture.close()
+        return self._format_result(command, recording["returncode"], stdout.text(), stderr.text())
+
+    def _execute(self, command: str):
+        recording = self.recordings.get(normalize_command(command))
+        if recording is not None and self.latency_scale:
+            time.sleep(recording["elapsed_s"] * self.latency_scale)
+        return self.replay(command)
+
+    async def _execute_async(self, command: str):
+        recording = self.recordings.get(normalize_command(command))
+        if recording is not None and self.latency_scale:
+            await asyncio.sleep(recording["elapsed_s"] * self.latency_scale)
+        return self.replay(command)
+
+    def _format_output(self, command: str, body: str) -> str:
+        return f"--- Command Output for '{command}' ---\nSystem: {self.target_platform} {self.recorded_release}\n\n{body}"
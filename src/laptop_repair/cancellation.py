@@ -0,0 +1,56 @@
+import threading
+
+
+class DiagnosisCancelled(Exception):
+    """Raised when a diagnosis is aborted through its CancellationToken."""
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation flag shared by the GUI/CLI, the crew and the tool.
+
+    Callbacks registered with `add_callback` run once, on the cancelling thread,
+    and are used to kill running subprocesses and wake up waiting threads.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def add_callback(self, callback):
+        """Register `callback()`; it runs immediately if the token is already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return callback
+        callback()
+        return callback
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise DiagnosisCancelled("The diagnosis was cancelled.")
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._event.wait(timeout)
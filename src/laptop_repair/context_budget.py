@@ -0,0 +1,142 @@
+import hashlib
+import json
+import re
+import threading
+from src.laptop_repair.events import emit
+from src.laptop_repair.tools.command_cache import normalize_command
+from src.laptop_repair.tools.custom_tool import OUTPUT_HEADER_RE
+
+# Rough conversion used for budgeting; close enough for English text and command output
+CHARS_PER_TOKEN = 4
+# Tokens of tool observations re-sent with every LLM turn
+DEFAULT_CONTEXT_BUDGET_TOKENS = 6000
+# The newest observations are always sent in full, whatever the budget
+KEEP_RECENT_OBSERVATIONS = 2
+# Lines of an older observation kept when it is condensed
+CONDENSED_LINES = 6
+
+# crewai appends each tool result to the assistant message of that step after this marker
+_OBSERVATION_MARKER = "\nObservation:"
+_REJECTION_RE = re.compile(r"\AError: The command '.*' is not permitted")
+# Observations carrying the allowlist are never condensed; later rejections refer to them
+_ALLOWLIST_MARKER = "Allowed commands for "
+# The ObservationCompactor's back-references; the observation they name is kept whole
+_REFERENCE_RE = re.compile(r"\((?:Same output as|Output unchanged since) the earlier '(.+?)' observation\.\)")
+_ACTION_INPUT_RE = re.compile(r"Action Input:\s*(\{.*\})\s*\Z", re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ObservationCompactor:
+    """
+    Shortens tool results of one diagnosis before the agent sees them: the per-command
+    banner is dropped, repeated outputs become a reference to the first one, and only
+    the first rejected command lists the whole allowlist.
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._allowlist_shown = False
+        self._lock = threading.Lock()
+
+    def compact(self, command: str, result: str) -> str:
+        if _REJECTION_RE.match(result):
+            with self._lock:
+                first, self._allowlist_shown = not self._allowlist_shown, True
+            if first:
+                return result
+            return result.split("\n", 1)[0] + " Use one of the allowed commands listed after the first rejected command."
+
+        body = OUTPUT_HEADER_RE.sub("", result)
+        if body.startswith("Error:") or not body.strip():
+            return body
+        digest = hashlib.sha1(body.strip().encode("utf-8")).hexdigest()
+        with self._lock:
+            earlier = self._seen.get(digest)
+            if earlier is None:
+                self._seen[digest] = command
+                return body
+        if normalize_command(earlier) == normalize_command(command):
+            return f"(Output unchanged since the earlier '{command}' observation.)"
+        return f"(Same output as the earlier '{earlier}' observation.)"
+
+
+def _condense(observation: str) -> str:
+    lines = observation.strip().splitlines()
+    if len(lines) <= CONDENSED_LINES:
+        return observation
+    kept = "\n".join(lines[:CONDENSED_LINES])
+    return f" {kept}\n... [{len(lines) - CONDENSED_LINES} more lines condensed; run the command again to see it in full]"
+
+
+def _action_command(head: str):
+    """The command of a step's 'Action Input: {"command": ...}', normalized, or None."""
+    match = _ACTION_INPUT_RE.search(head)
+    if not match:
+        return None
+    try:
+        command = json.loads(match.group(1)).get("command")
+    except (ValueError, AttributeError):
+        return None
+    return normalize_command(command) if isinstance(command, str) else None
+
+
+def compact_messages(messages: list, budget_tokens: int = DEFAULT_CONTEXT_BUDGET_TOKENS,
+                     keep_recent: int = KEEP_RECENT_OBSERVATIONS):
+    """
+    Fit the observations in `messages` into `budget_tokens`, newest first: recent ones stay
+    whole, older ones are condensed to their first lines and then dropped once even that
+    does not fit. Observations carrying the allowlist or referenced by a later repeat of the
+    same output are never shortened, so running a command again restores its full output.
+    Returns (messages, tokens saved); the input list is not modified.
+    """
+    steps = [
+        i for i, message in enumerate(messages)
+        if message.get("role") == "assistant" and _OBSERVATION_MARKER in (message.get("content") or "")
+    ]
+    parts = {i: messages[i]["content"].split(_OBSERVATION_MARKER, 1) for i in steps}
+    # A repeated command only gets a back-reference from the compactor, so every full
+    # observation of a referenced command must stay in the prompt for it to make sense
+    referenced = {normalize_command(command) for _, observation in parts.values()
+                  for command in _REFERENCE_RE.findall(observation)}
+    compacted = list(messages)
+    remaining = budget_tokens
+    saved = 0
+    for rank, i in enumerate(reversed(steps)):
+        head, observation = parts[i]
+        cost = estimate_tokens(observation)
+        pinned = _ALLOWLIST_MARKER in observation or (
+            _action_command(head) in referenced and not _REFERENCE_RE.search(observation))
+        if rank < keep_recent or cost <= remaining or pinned:
+            remaining -= cost
+            continue
+        replacement = _condense(observation)
+        if estimate_tokens(replacement) > remaining:
+            replacement = " [Output omitted; run the command again to see it in full.]"
+        remaining -= estimate_tokens(replacement)
+        saved += cost - estimate_tokens(replacement)
+        compacted[i] = dict(messages[i], content=f"{head}{_OBSERVATION_MARKER}{replacement}")
+    return compacted, saved
+
+
+def budget_llm(llm, budget_tokens: int = DEFAULT_CONTEXT_BUDGET_TOKENS, keep_recent: int = KEEP_RECENT_OBSERVATIONS):
+    """
+    Wrap `llm.call` so every request carries at most `budget_tokens` of observations, which
+    keeps the prompt size flat over a long ReAct loop. crewai's own history is not changed.
+    """
+    if getattr(llm, "_context_budget", None) is not None:
+        return llm
+    original_call = llm.call
+
+    def call(messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        if not isinstance(messages, str):
+            messages, saved = compact_messages(messages, budget_tokens, keep_recent)
+            if saved:
+                emit("context_compacted", model=getattr(llm, "model", None), saved_tokens=saved)
+        return original_call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions, **kwargs)
+
+    llm.call = call
+    llm._context_budget = budget_tokens
+    return llm
@@ -1,79 +1,302 @@
+import contextvars
 import os
+import threading
+import time
 import yaml
 from crewai import Agent, Task, Crew, Process, LLM
 from src.laptop_repair.tools.custom_tool import SystemCommandTool
+from src.laptop_repair.tools.prefetch import DiagnosticPrefetcher
+from src.laptop_repair.events import emit, install_crewai_bridge, listening
+from src.laptop_repair.cancellation import CancellationToken, DiagnosisCancelled
+from src.laptop_repair.fix_script import expand_fix_plan
+from src.laptop_repair.llm_cache import LLMResponseCache, cache_llm
+from src.laptop_repair.context_budget import DEFAULT_CONTEXT_BUDGET_TOKENS, ObservationCompactor, budget_llm
+from src.laptop_repair.diagnosis_cache import DiagnosisCache, collect_system_fingerprint, fingerprint_hash
+from src.laptop_repair.similar_diagnoses import SimilarDiagnosisIndex
+from src.laptop_repair.structured_report import DiagnosisReport, parse_report, reformat_messages, render_report
+from src.laptop_repair.tracing import instrument_llm, span
+from src.laptop_repair.triage import run_triage
+
+DEFAULT_MODEL = "gemini/gemini-1.5-flash-latest"
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config')
 
 def load_yaml(file_path: str) -> dict:
     """Helper function to load a YAML file."""
     with open(file_path, 'r') as file:
         return yaml.safe_load(file)
 
-class LaptopRepairCrew:
-    def __init__(self, problem_description: str):
-        self.problem_description = problem_description
-        # Path to the config files (assuming they are in a 'config' subdirectory)
-        self.config_path = os.path.join(os.path.dirname(__file__), 'config')
+class LaptopRepairCrewFactory:
+    """
+    Long-lived builder that owns everything which is identical across diagnoses:
+    the LLM client (and with it litellm's pooled HTTP connections), the parsed
+    YAML configs and the diagnostic tool. Building a crew for a new problem only
+    creates the lightweight Agent/Task/Crew objects.
+    """
 
-        # Retrieve API key from environment variable
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set. Please provide the API key.")
-            
-        # Initialize the Gemini LLM with enhanced settings for better batch script generation
-        self.llm = LLM(model="gemini/gemini-1.5-flash-latest", api_key = api_key)
+    def __init__(self, api_key: str, model: str = DEFAULT_MODEL, config_path: str = CONFIG_PATH, stream: bool = False,
+                 llm=None, system_tool: SystemCommandTool = None, llm_cache: LLMResponseCache = None,
+                 context_budget_tokens: int = DEFAULT_CONTEXT_BUDGET_TOKENS):
+        self.model = model
+        self.config_path = config_path
+        # Streaming makes crewai publish every completion chunk as it arrives
+        self.stream = stream
+        # An llm/system_tool passed in (e.g. the offline benchmark's replay pair) replaces the real ones
+        self.llm = instrument_llm(llm if llm is not None else LLM(model=model, api_key=api_key, stream=stream))
+        # Tokens of tool observations re-sent per LLM turn; None sends the agent's history verbatim
+        self.context_budget_tokens = context_budget_tokens
+        if context_budget_tokens is not None:
+            budget_llm(self.llm, context_budget_tokens)
+        # Byte-identical requests (same prompts, same tool outputs) are answered from disk
+        self.llm_cache = llm_cache
+        if llm_cache is not None:
+            cache_llm(self.llm, llm_cache)
+        self.agents_config = load_yaml(os.path.join(config_path, 'agents.yaml'))
+        self.tasks_config = load_yaml(os.path.join(config_path, 'tasks.yaml'))
+        self.system_tool = system_tool if system_tool is not None else SystemCommandTool()
 
-    def run(self):
-        """
-        Initializes and runs the crew with configurations loaded from YAML files.
-        Returns a comprehensive diagnosis and batch script for fixing the system issue.
-        """
-        # Load agent and task configurations from YAML
-        agents_config = load_yaml(os.path.join(self.config_path, 'agents.yaml'))
-        tasks_config = load_yaml(os.path.join(self.config_path, 'tasks.yaml'))
- 
-        # Instantiate the enhanced system diagnostic tool
-        system_tool = SystemCommandTool()
+    def tool_for_run(self, cancel_token: CancellationToken = None, snapshot_store=None, prefetcher=None) -> SystemCommandTool:
+        """The shared tool, copied with this diagnosis' own observation compactor, cancel token, snapshot store and prefetcher."""
+        tool_overrides = {}
+        if self.context_budget_tokens is not None:
+            # Per-run, so outputs are only deduplicated within one investigation
+            tool_overrides['observation_compactor'] = ObservationCompactor()
+        if snapshot_store is not None:
+            tool_overrides['snapshot_store'] = snapshot_store
+        if prefetcher is not None:
+            tool_overrides['prefetcher'] = prefetcher
+        if cancel_token is not None:
+            # Per-run so cancelling one diagnosis only kills its own commands
+            tool_overrides['cancel_token'] = cancel_token
+        if tool_overrides:
+            return self.system_tool.model_copy(update=tool_overrides)
+        return self.system_tool
+
+    def create_crew(self, cancel_token: CancellationToken = None, snapshot_store=None, prefetcher=None) -> Crew:
+        system_tool = self.tool_for_run(cancel_token, snapshot_store, prefetcher)
+        crew_options = {}
+        agent_options = {}
+        if cancel_token is not None:
+            def check_cancelled(step_output):
+                cancel_token.raise_if_cancelled()
+
+            crew_options['step_callback'] = check_cancelled
+            # crewai re-runs a task that raised; after a cancel that would only mean more LLM calls
+            agent_options['max_retry_limit'] = 0
 
         # --- Create the Lead Diagnostician Agent ---
         lead_diagnostician = Agent(
-            **agents_config['lead_diagnostician_agent'],
+            **self.agents_config['lead_diagnostician_agent'],
             tools=[system_tool],
             llm=self.llm,
             verbose=True,
-            allow_delegation=False
+            allow_delegation=False,
+            **agent_options
         )
 
         # --- Create the System Analysis Task ---
         system_analysis_task = Task(
-            **tasks_config['system_analysis_task'],
+            **self.tasks_config['system_analysis_task'],
             agent=lead_diagnostician,
+            # crewai appends the schema to the prompt and validates the final answer against it
+            output_pydantic=DiagnosisReport,
         )
 
         # --- Assemble the Crew ---
-        crew = Crew(
+        return Crew(
             agents=[lead_diagnostician],
             tasks=[system_analysis_task],
             process=Process.sequential,
-            verbose=True
+            verbose=True,
+            **crew_options
         )
 
+_factories = {}
+_factories_lock = threading.Lock()
+
+def get_crew_factory(api_key: str, model: str = DEFAULT_MODEL, stream: bool = False, llm_cache: LLMResponseCache = None) -> LaptopRepairCrewFactory:
+    """Return the process-wide factory for this API key, model, streaming mode and LLM cache, creating it on first use."""
+    key = (api_key, model, stream, id(llm_cache))
+    with _factories_lock:
+        factory = _factories.get(key)
+        if factory is None:
+            factory = LaptopRepairCrewFactory(api_key, model=model, stream=stream, llm_cache=llm_cache)
+            _factories[key] = factory
+        return factory
+
+class LaptopRepairCrew:
+    def __init__(self, problem_description: str, prefetch: bool = False, factory: LaptopRepairCrewFactory = None, stream: bool = False, diagnosis_cache: DiagnosisCache = None,
+                 similar_index: SimilarDiagnosisIndex = None, similar_answer_threshold: float = 0.9, similar_context_threshold: float = 0.35,
+                 snapshot_store=None, triage: bool = False, format_retries: int = 1, llm_cache: LLMResponseCache = None):
+        self.problem_description = problem_description
+        # Start the read-only diagnostics in the background while the LLM plans
+        self.prefetch = prefetch
+        # Answer repeat problems on an unchanged system from disk instead of the LLM
+        self.diagnosis_cache = diagnosis_cache
+        # Past diagnoses of paraphrased problems: returned outright above the answer
+        # threshold, otherwise passed to the agent as context above the context threshold
+        self.similar_index = similar_index
+        self.similar_answer_threshold = similar_answer_threshold
+        self.similar_context_threshold = similar_context_threshold
+        # SnapshotStore of this host: the agent sees what changed since the last diagnosis
+        self.snapshot_store = snapshot_store
+        # Run the command bundles matching the problem's keywords up front and hand
+        # their output to the agent, which then needs far fewer tool turns
+        self.triage = triage
+        # LLM calls allowed to reformat a final answer that fails validation; the
+        # diagnosis itself is never repeated for a formatting mistake
+        self.format_retries = format_retries
+        # DiagnosisReport of the last run, when its answer could be structured
+        self.structured_report = None
+        # DiagnosticPrefetcher of the current run, when prefetching
+        self._prefetcher = None
+
+        if factory is None:
+            # Retrieve API key from environment variable
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable not set. Please provide the API key.")
+            factory = get_crew_factory(api_key, stream=stream, llm_cache=llm_cache)
+
+        # The LLM client, configs and tool are shared with every other crew from this factory
+        self.factory = factory
+        self.config_path = factory.config_path
+        self.llm = factory.llm
+
+    def run(self, on_event=None, cancel_token: CancellationToken = None):
+        """
+        Builds a crew from the shared factory and runs it.
+        Returns a comprehensive diagnosis and batch script for fixing the system issue.
+        If given, `on_event(DiagnosticEvent)` receives LLM tokens and command timings
+        while the crew runs; it is called from worker threads.
+        Cancelling `cancel_token` kills running commands, stops the agent at its next
+        step and raises DiagnosisCancelled right away.
+        """
+        with span("diagnosis", "crew", problem=self.problem_description):
+            try:
+                if on_event is None:
+                    return self._run(cancel_token)
+                install_crewai_bridge()
+                with listening(on_event):
+                    return self._run(cancel_token)
+            finally:
+                if self._prefetcher is not None:
+                    self._prefetcher.shutdown()
+                    self._prefetcher = None
+
+    def _kickoff(self, crew: Crew, inputs: dict, cancel_token: CancellationToken):
+        with span("crew.kickoff", "crew"):
+            return self._kickoff_inner(crew, inputs, cancel_token)
+
+    def _kickoff_inner(self, crew: Crew, inputs: dict, cancel_token: CancellationToken):
+        if cancel_token is None:
+            return crew.kickoff(inputs=inputs)
+
+        # Run the crew on its own thread so a cancel returns control immediately,
+        # even while an LLM request is still in flight; the abandoned thread stops
+        # at the crew's next step callback.
+        outcome = {}
+        finished = threading.Event()
+
+        def target():
+            try:
+                outcome['result'] = crew.kickoff(inputs=inputs)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                finished.set()
+
+        # The copied context keeps the thread's tool and LLM spans under this kickoff
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(target,), name="crew-kickoff", daemon=True).start()
+        wake = cancel_token.add_callback(finished.set)
+        finished.wait()
+        cancel_token.remove_callback(wake)
+        cancel_token.raise_if_cancelled()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def _run(self, cancel_token: CancellationToken = None):
+        started = time.perf_counter()
+        self.structured_report = None
+        emit("diagnosis_started", problem=self.problem_description)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        fingerprint = None
+        if self.diagnosis_cache is not None:
+            fingerprint = fingerprint_hash(collect_system_fingerprint())
+            cached = self.diagnosis_cache.get(self.problem_description, fingerprint)
+            emit("diagnosis_cache_lookup", cache="exact", hit=cached is not None)
+            if cached is not None:
+                print("⚡ Laptop Repair Crew: Reusing the cached diagnosis for this problem on an unchanged system.")
+                emit("diagnosis_cache_hit", problem=self.problem_description)
+                self._emit_finished("cache", started)
+                return cached.report
+
+        related_diagnoses = ""
+        if self.similar_index is not None:
+            if fingerprint is None:
+                fingerprint = fingerprint_hash(collect_system_fingerprint())
+            matches = self.similar_index.search(self.problem_description, k=3)
+            # Only a report written for the system as it is now is reused outright; otherwise it is context
+            reusable = next((m for m in matches if m.score >= self.similar_answer_threshold and m.fingerprint == fingerprint), None)
+            emit("diagnosis_cache_lookup", cache="similar", hit=reusable is not None)
+            if reusable is not None:
+                print(f"⚡ Laptop Repair Crew: Reusing the diagnosis of a near-identical problem on an unchanged system (similarity {reusable.score:.2f}).")
+                emit("similar_diagnosis_hit", problem=self.problem_description, matched=reusable.problem, score=reusable.score)
+                self._emit_finished("similar", started)
+                return reusable.report
+            related = [m for m in matches if m.score >= self.similar_context_threshold]
+            related_diagnoses = self.similar_index.format_context(related)
+
+        if self.prefetch:
+            # A prefetcher of this run's own, used through this run's tool, so a cancel also
+            # kills the prefetched commands and concurrent runs never take each other's results
+            self._prefetcher = DiagnosticPrefetcher()
+            self.factory.tool_for_run(cancel_token, self.snapshot_store, self._prefetcher).prefetch()
+
+        triage_evidence = ""
+        if self.triage:
+            triage = run_triage(self.problem_description, self.factory.tool_for_run(cancel_token, self.snapshot_store, self._prefetcher))
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            print(f"🩺 Laptop Repair Crew: Triage ran {len(triage.commands)} commands for: {', '.join(triage.categories)} ({triage.elapsed_s:.1f} s).")
+            triage_evidence = triage.format_evidence()
+
+        inputs = {
+            'problem_description': self.problem_description,
+            'related_diagnoses': related_diagnoses or "None.",
+            'triage_evidence': triage_evidence or "None.",
+        }
+
+        crew = self.factory.create_crew(cancel_token, snapshot_store=self.snapshot_store, prefetcher=self._prefetcher)
+
         print("🔧 Laptop Repair Crew: Starting comprehensive system diagnosis...")
         print(f"📋 Problem to investigate: {self.problem_description}")
         
         try:
             # Execute the crew with the problem description
-            result = crew.kickoff(inputs={'problem_description': self.problem_description})
+            result = self._kickoff(crew, inputs, cancel_token)
             
             print("✅ Laptop Repair Crew: Diagnosis and batch script generation complete.")
             
-            # Ensure the result is properly formatted
-            if hasattr(result, 'raw'):
-                return str(result.raw)
-            else:
-                return str(result)
+            report = self._format_report(result)
+
+            if self.diagnosis_cache is not None:
+                self.diagnosis_cache.put(self.problem_description, fingerprint, report)
+            if self.similar_index is not None:
+                self.similar_index.add(self.problem_description, report, fingerprint)
+            self._emit_finished("llm", started)
+            return report
                 
+        except DiagnosisCancelled:
+            print("⛔ Laptop Repair Crew: Diagnosis cancelled.")
+            emit("diagnosis_cancelled", problem=self.problem_description)
+            raise
         except Exception as e:
             print(f"❌ Error during crew execution: {str(e)}")
+            emit("diagnosis_failed", problem=self.problem_description, error=str(e), elapsed_s=time.perf_counter() - started)
             # Return a fallback diagnostic report
             return f"""
 **Problem Summary:** {self.problem_description}
@@ -97,11 +320,46 @@ chkdsk C: /f
 
 Note: The automated batch script generation failed. Please run these commands manually in an Administrator Command Prompt.
 """
+        finally:
+            if self.snapshot_store is not None:
+                self.snapshot_store.save()
+
+    def _format_report(self, result) -> str:
+        """Render the validated answer; only the formatting is retried when validation fails."""
+        system = self.factory.system_tool.target_platform
+        raw = str(result.raw) if hasattr(result, 'raw') else str(result)
+        structured = getattr(result, 'pydantic', None)
+        if not isinstance(structured, DiagnosisReport):
+            structured = self._restructure(raw)
+        if structured is None:
+            # Free text that could not be structured: keep it, expanding a fix plan block if it has one
+            return expand_fix_plan(raw, system)
+        self.structured_report = structured
+        return render_report(structured, system)
+
+    def _restructure(self, raw: str):
+        try:
+            return parse_report(raw)
+        except ValueError as e:
+            error = str(e)
+        for attempt in range(1, self.format_retries + 1):
+            emit("report_format_retry", problem=self.problem_description, attempt=attempt, error=error)
+            with span("report.reformat", "crew", attempt=attempt):
+                try:
+                    return parse_report(self.llm.call(reformat_messages(raw, error)))
+                except ValueError as e:
+                    error = str(e)
+                except Exception as e:
+                    print(f"❌ Could not reformat the final report: {str(e)}")
+                    break
+        return None
+
+    def _emit_finished(self, source: str, started: float):
+        emit("diagnosis_finished", problem=self.problem_description, source=source, elapsed_s=time.perf_counter() - started)
 
     def get_system_info(self):
         """Helper method to get basic system information for debugging."""
         try:
-            system_tool = SystemCommandTool()
-            return system_tool._run("systeminfo")
+            return self.factory.system_tool._run("systeminfo")
         except Exception as e:
             return f"Unable to retrieve system information: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import platform
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import psutil
+from src.laptop_repair.report import split_report
+
+try:
+    # pysqlite3-binary (a dependency of this project) bundles a current SQLite for
+    # platforms whose sqlite3 is too old; the SQLite caches all import it from here
+    import pysqlite3 as sqlite3
+except ImportError:
+    import sqlite3
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".laptop_repair")
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# Disk usage only counts as "changed" once it moves by this many percentage points
+_DISK_BUCKET_PCT = 5
+
+
+def normalize_problem(problem: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial rewording shares a key."""
+    words = re.sub(r"[^\w\s]", " ", problem.lower()).split()
+    return " ".join(words)
+
+
+def collect_system_fingerprint() -> dict:
+    """OS, hardware and coarse state that should invalidate a cached diagnosis when it changes."""
+    fingerprint = {
+        "os": platform.system(),
+        "release": platform.release(),
+        "version": platform.version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "node": platform.node(),
+    }
+    try:
+        fingerprint["cpu_count"] = psutil.cpu_count()
+        fingerprint["memory_total"] = psutil.virtual_memory().total
+        # A reboot is the most common "I already tried that" state change
+        fingerprint["boot_time"] = int(psutil.boot_time())
+        disks = {}
+        for part in psutil.disk_partitions(all=False):
+            try:
+                usage = psutil.disk_usage(part.mountpoint)
+            except OSError:
+                continue
+            disks[part.mountpoint] = int(usage.percent // _DISK_BUCKET_PCT) * _DISK_BUCKET_PCT
+        fingerprint["disks"] = disks
+    except (psutil.Error, OSError):
+        pass
+    return fingerprint
+
+
+def fingerprint_hash(fingerprint: dict) -> str:
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedDiagnosis:
+    problem: str
+    report: str
+    script: str
+    created_at: float
+
+
+class DiagnosisCache:
+    """
+    SQLite-backed cache of final reports keyed on the normalized problem text
+    plus a hash of the system fingerprint. Entries expire after `ttl` seconds
+    and the least recently used ones are evicted beyond `max_bytes`.
+    """
+
+    def __init__(self, path: str = None, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        if path is None:
+            cache_dir = os.getenv("LAPTOP_REPAIR_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "diagnoses.sqlite3")
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS diagnoses (
+                    key TEXT PRIMARY KEY,
+                    problem TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    script TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS diagnoses_lru ON diagnoses (last_used_at)")
+
+    @staticmethod
+    def make_key(problem: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{normalize_problem(problem)}\0{fingerprint}".encode("utf-8")).hexdigest()
+
+    def get(self, problem: str, fingerprint: str) -> Optional[CachedDiagnosis]:
+        key = self.make_key(problem, fingerprint)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT problem, report, script, created_at FROM diagnoses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[3] + self.ttl <= now:
+                self._conn.execute("DELETE FROM diagnoses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE diagnoses SET last_used_at = ? WHERE key = ?", (now, key))
+        return CachedDiagnosis(problem=row[0], report=row[1], script=row[2], created_at=row[3])
+
+    def put(self, problem: str, fingerprint: str, report: str):
+        key = self.make_key(problem, fingerprint)
+        _, script = split_report(report)
+        size = len(report.encode("utf-8")) + len(problem.encode("utf-8"))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO diagnoses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, problem, fingerprint, report, script, size, now, now),
+            )
+            self._evict(now)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM diagnoses")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM diagnoses WHERE created_at <= ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM diagnoses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM diagnoses ORDER BY last_used_at").fetchall():
+            self._conn.execute("DELETE FROM diagnoses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
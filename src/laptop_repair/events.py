@@ -0,0 +1,82 @@
+import contextlib
+import contextvars
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DiagnosticEvent:
+    """A progress event pushed from the crew to whoever is listening (GUI, CLI, service)."""
+    kind: str
+    data: dict = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_bridge_installed = False
+# Listeners that only see events emitted from their own run (thread/task context)
+_scoped_listeners = contextvars.ContextVar("laptop_repair_event_listeners", default=())
+
+
+def add_listener(callback):
+    """Register `callback(event)`; it is called from whichever thread emits the event."""
+    with _listeners_lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    with _listeners_lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+@contextlib.contextmanager
+def listening(callback):
+    """
+    Deliver events emitted inside this block to `callback`, including from threads and
+    tasks that copy the context. Unlike add_listener, concurrent runs don't see each
+    other's events.
+    """
+    token = _scoped_listeners.set(_scoped_listeners.get() + (callback,))
+    try:
+        yield
+    finally:
+        _scoped_listeners.reset(token)
+
+
+def emit(kind: str, **data):
+    scoped = _scoped_listeners.get()
+    # Cheap no-op when nobody is listening, which is the common CLI case
+    if not _listeners and not scoped:
+        return
+    event = DiagnosticEvent(kind, data)
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for callback in listeners + list(scoped):
+        try:
+            callback(event)
+        except Exception:
+            pass
+
+
+def install_crewai_bridge():
+    """Forward crewai's LLM streaming chunks as 'llm_token' events. Safe to call repeatedly."""
+    global _bridge_installed
+    with _listeners_lock:
+        if _bridge_installed:
+            return
+        _bridge_installed = True
+    try:
+        from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+    except ImportError:
+        try:
+            from crewai.events import crewai_event_bus, LLMStreamChunkEvent
+        except ImportError:
+            # Older crewai without an event bus; command events still flow
+            return
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _on_llm_chunk(source, event):
+        emit("llm_token", text=event.chunk)
@@ -0,0 +1,193 @@
+import json
+import re
+import shlex
+from typing import List
+from pydantic import BaseModel, Field, ValidationError
+from src.laptop_repair.report import FIX_PLAN_END_MARKER, FIX_PLAN_START_MARKER, SCRIPT_END_MARKER, SCRIPT_START_MARKER
+from src.laptop_repair.tools.command_cache import normalize_command
+from src.laptop_repair.tools.custom_tool import _get_safe_fix_commands
+
+_FENCE_RE = re.compile(r"^```[a-z]*\s*|\s*```$")
+
+
+class FixSelection(BaseModel):
+    # A category name from get_fix_commands, e.g. "disk_cleanup"
+    category: str
+    # One line shown to the user before the step; why this category was chosen
+    reason: str = ""
+    # Subset of the category's commands to run; empty runs the whole category
+    commands: List[str] = Field(default_factory=list)
+
+
+class FixPlan(BaseModel):
+    fixes: List[FixSelection] = Field(default_factory=list)
+    # Ask the user to restart once every step has run
+    restart: bool = False
+
+
+def parse_fix_plan(text: str) -> FixPlan:
+    """Parse the agent's JSON selection (optionally inside a ``` fence); raises ValueError if it is malformed."""
+    text = _FENCE_RE.sub("", text.strip())
+    try:
+        return FixPlan.model_validate(json.loads(text))
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise ValueError(f"The fix plan is not valid: {e}") from e
+
+
+def _one_line(text: str) -> str:
+    """Agent-supplied text is echoed or commented in the script, so it must not span lines."""
+    return " ".join(text.split())
+
+
+def resolve_plan(plan: FixPlan, system: str):
+    """
+    Match the plan against the safe-fix catalog of `system`.
+    Returns ([(category, reason, commands)], skipped); only catalog commands survive.
+    """
+    catalog = _get_safe_fix_commands(system)
+    steps = []
+    skipped = []
+    seen = set()
+    for selection in plan.fixes:
+        category = selection.category.strip().lower().replace(" ", "_")
+        if category not in catalog:
+            skipped.append(f"category '{_one_line(selection.category)}'")
+            continue
+        if category in seen:
+            continue
+        seen.add(category)
+        available = {normalize_command(cmd): cmd for cmd in catalog[category]}
+        if selection.commands:
+            commands = []
+            for command in selection.commands:
+                match = available.get(normalize_command(command))
+                if match is None:
+                    skipped.append(f"'{_one_line(command)}'")
+                elif match not in commands:
+                    commands.append(match)
+        else:
+            commands = list(catalog[category])
+        if commands:
+            steps.append((category, _one_line(selection.reason), commands))
+    return steps, skipped
+
+
+def _title(category: str) -> str:
+    return category.replace("_", " ").capitalize()
+
+
+def _bat_escape(text: str) -> str:
+    """Literal text for echo/REM lines: batch metacharacters are caret-escaped and % doubled."""
+    text = _one_line(text).replace("%", "%%")
+    for char in "^&|<>()":
+        text = text.replace(char, "^" + char)
+    return text
+
+
+def render_batch_script(plan: FixPlan, system: str = "Windows") -> str:
+    """Expand a plan into a Windows batch script with confirmations and errorlevel checks."""
+    steps, skipped = resolve_plan(plan, system)
+    lines = [
+        "@echo off",
+        "setlocal",
+        "title Laptop Repair - Fix Script",
+        "echo ============================================",
+        "echo  Laptop Repair fix script",
+        "echo ============================================",
+        "REM Every command below comes from the tool's safe-fix catalog.",
+    ]
+    lines += [f"REM Skipped {_bat_escape(item)}: not in the safe-fix catalog." for item in skipped]
+    lines += [
+        "net session >nul 2>&1",
+        "if errorlevel 1 (",
+        "    echo This script must be run as Administrator: right-click it and choose \"Run as administrator\".",
+        "    pause",
+        "    exit /b 1",
+        ")",
+        "set FAILURES=0",
+    ]
+    for number, (category, reason, commands) in enumerate(steps, start=1):
+        heading = f"[{number}/{len(steps)}] {_title(category)}" + (f": {reason}" if reason else "")
+        lines += [
+            "",
+            f"REM --- {_title(category)} ---",
+            "echo.",
+            f"echo {_bat_escape(heading)}",
+            "choice /C YN /M \"Run this step\"",
+            f"if errorlevel 2 goto skip_{number}",
+        ]
+        for command in commands:
+            lines += [
+                f"echo   Running: {_bat_escape(command)}",
+                command,
+                "if errorlevel 1 (",
+                "    echo   WARNING: the command above failed with exit code %errorlevel%.",
+                "    set /a FAILURES+=1",
+                ")",
+            ]
+        lines.append(f":skip_{number}")
+    lines += [
+        "",
+        "echo.",
+        "if %FAILURES%==0 (echo All selected steps finished.) else (echo %FAILURES% command^(s^) reported errors; see the warnings above.)",
+    ]
+    if plan.restart:
+        lines.append("echo Please restart the computer to complete the repairs.")
+    lines += ["pause", "endlocal"]
+    return "\n".join(lines)
+
+
+def render_shell_script(plan: FixPlan, system: str = "Linux") -> str:
+    """Expand a plan into a bash script with the same confirmations and failure count."""
+    steps, skipped = resolve_plan(plan, system)
+    lines = [
+        "#!/usr/bin/env bash",
+        "# Laptop Repair fix script; every command below comes from the tool's safe-fix catalog.",
+    ]
+    lines += [f"# Skipped {item}: not in the safe-fix catalog." for item in skipped]
+    lines += [
+        "failures=0",
+        "confirm() { read -r -p \"$1 [y/N] \" answer; [[ \"$answer\" =~ ^[Yy]$ ]]; }",
+    ]
+    for number, (category, reason, commands) in enumerate(steps, start=1):
+        heading = f"[{number}/{len(steps)}] {_title(category)}" + (f": {reason}" if reason else "")
+        lines += ["", f"# --- {_title(category)} ---", "echo", f"echo {shlex.quote(heading)}", "if confirm \"Run this step?\"; then"]
+        for command in commands:
+            lines += [
+                f"    echo {shlex.quote('  Running: ' + command)}",
+                f"    if ! {command}; then",
+                "        echo \"  WARNING: the command above failed.\"",
+                "        failures=$((failures + 1))",
+                "    fi",
+            ]
+        lines.append("fi")
+    lines += [
+        "",
+        "echo",
+        "if [ \"$failures\" -eq 0 ]; then echo \"All selected steps finished.\"; else echo \"$failures command(s) reported errors; see the warnings above.\"; fi",
+    ]
+    if plan.restart:
+        lines.append("echo \"Please restart the computer to complete the repairs.\"")
+    return "\n".join(lines)
+
+
+def render_fix_script(plan: FixPlan, system: str) -> str:
+    if system == "Windows":
+        return render_batch_script(plan, system)
+    return render_shell_script(plan, system)
+
+
+def expand_fix_plan(report: str, system: str) -> str:
+    """
+    Replace the agent's fix plan block with the rendered script between the script markers.
+    Reports without a plan (e.g. a script the agent wrote itself) are returned unchanged.
+    """
+    if FIX_PLAN_START_MARKER not in report:
+        return report
+    before, rest = report.split(FIX_PLAN_START_MARKER, 1)
+    plan_text, _, after = rest.partition(FIX_PLAN_END_MARKER)
+    try:
+        script = render_fix_script(parse_fix_plan(plan_text), system)
+    except ValueError as e:
+        return f"{before.rstrip()}\n\n**Fix Script:** Not generated. {e}\n{after}"
+    return f"{before.rstrip()}\n\n{SCRIPT_START_MARKER}\n{script}\n{SCRIPT_END_MARKER}\n{after.lstrip()}"
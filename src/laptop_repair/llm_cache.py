@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from src.laptop_repair.diagnosis_cache import DEFAULT_CACHE_DIR, sqlite3
+from src.laptop_repair.events import emit
+
+DEFAULT_LLM_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+class LLMCacheMiss(Exception):
+    """A replay-mode cache has no recorded response for this request."""
+
+
+def request_key(model, messages, tools=None, temperature=None, stop=None) -> str:
+    """Hash of everything that decides the completion; identical requests share a key."""
+    payload = {"model": model, "messages": messages, "tools": tools, "temperature": temperature, "stop": stop}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed store of LLM completions keyed on request_key(). The least recently
+    used entries are evicted beyond `max_bytes`. With `replay=True` the cache is read-only
+    and a miss raises LLMCacheMiss instead of calling the model, for offline runs.
+    Identical requests in flight at the same time are sent once and share the answer.
+    """
+
+    def __init__(self, path: str = None, ttl: float = DEFAULT_LLM_CACHE_TTL, max_bytes: int = DEFAULT_LLM_CACHE_MAX_BYTES,
+                 replay: bool = False):
+        if path is None:
+            cache_dir = os.getenv("LAPTOP_REPAIR_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "llm_responses.sqlite3")
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        # Requests answered by joining an identical request that was already in flight
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_lru ON llm_responses (last_used_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            # Recorded responses never expire during replay, or offline tests would rot
+            if not self.replay and row[1] + self.ttl <= now:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                return None
+            if not self.replay:
+                self._conn.execute("UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, response: str, model: str = None):
+        if self.replay:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def get_or_call(self, key: str, call, model: str = None):
+        """
+        Return (response, source) where source is 'hit', 'shared' or 'miss'. Only the first
+        of several concurrent identical requests runs `call()`; the others wait for it.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self._count("hits")
+            return cached, "hit"
+
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+        if not leader:
+            self._count("shared")
+            return flight.result(), "shared"
+
+        try:
+            # A request that finished between the lookup above and taking the lead
+            response = self.get(key)
+            source = "hit"
+            if response is None:
+                if self.replay:
+                    raise LLMCacheMiss(f"No recorded LLM response for request {key[:12]} (replay mode).")
+                response = call()
+                source = "miss"
+                if isinstance(response, str):
+                    self.put(key, response, model)
+            flight.set_result(response)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        self._count("hits" if source == "hit" else "misses")
+        return response, source
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "shared": self.shared, "entries": entries, "bytes": size}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_responses")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used_at").fetchall():
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def cache_llm(llm, cache: LLMResponseCache):
+    """
+    Wrap `llm.call` so identical requests are answered from `cache`. Wrap an
+    instrumented LLM, so the latency metrics and spans only count real requests.
+    """
+    if getattr(llm, "_response_cache", None) is cache:
+        return llm
+    original_call = llm.call
+
+    def call(messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        model = getattr(llm, "model", None)
+        key = request_key(model, messages, tools, getattr(llm, "temperature", None), getattr(llm, "stop", None))
+        response, source = cache.get_or_call(
+            key,
+            lambda: original_call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions, **kwargs),
+            model,
+        )
+        emit("llm_cache_lookup", model=model, result=source)
+        return response
+
+    llm.call = call
+    llm._response_cache = cache
+    return llm
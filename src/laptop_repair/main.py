@@ -1,10 +1,121 @@
 import argparse
+import contextlib
+import json
 import sys
 import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from src.laptop_repair.crew import LaptopRepairCrew
+# crewai/litellm are imported only once a diagnosis actually runs, so --help
+# and argument errors come back instantly
+from src.laptop_repair.cancellation import CancellationToken, DiagnosisCancelled
+
+def read_batch(stream):
+    """Yield (id, problem) pairs from JSONL: objects with a 'problem' field or bare JSON strings."""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            yield str(line_number), item
+        else:
+            problem = item.get("problem") or item.get("problem_description")
+            if not problem:
+                raise ValueError(f"Line {line_number} has no 'problem' field.")
+            yield str(item.get("id", line_number)), problem
+
+def install_sigint_cancellation(cancel_token: CancellationToken):
+    """Make the first Ctrl+C cancel the diagnosis; a second one interrupts as usual."""
+    def handler(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        print("\nCancelling diagnosis... (press Ctrl+C again to force quit)", file=sys.stderr)
+        cancel_token.cancel()
+    signal.signal(signal.SIGINT, handler)
+
+def diagnose(problem_id: str, problem: str, factory, prefetch: bool, cancel_token: CancellationToken = None, diagnosis_cache=None, similar_index=None, triage: bool = False) -> dict:
+    from src.laptop_repair.crew import LaptopRepairCrew
+
+    started = time.perf_counter()
+    try:
+        crew = LaptopRepairCrew(problem, prefetch=prefetch, factory=factory, diagnosis_cache=diagnosis_cache, similar_index=similar_index, triage=triage)
+        report = crew.run(cancel_token=cancel_token)
+        record = {"id": problem_id, "problem": problem, "status": "ok", "report": report}
+        if crew.structured_report is not None:
+            record["structured"] = crew.structured_report.model_dump()
+    except DiagnosisCancelled:
+        record = {"id": problem_id, "problem": problem, "status": "cancelled"}
+    except Exception as e:
+        record = {"id": problem_id, "problem": problem, "status": "error", "error": str(e)}
+    record["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return record
+
+def run_batch(input_path: str, output_path: str, workers: int, prefetch: bool = False, cancel_token: CancellationToken = None, diagnosis_cache=None, similar_index=None, triage: bool = False, llm_cache=None) -> int:
+    """
+    Diagnose every problem in a JSONL file (or stdin for '-') on `workers` concurrent crews.
+    All crews share one LLM client and the process-wide command result cache. Results are
+    written as JSONL in completion order. Returns the number of failed diagnoses.
+    """
+    from src.laptop_repair.crew import get_crew_factory
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set. Please provide the API key.")
+    factory = get_crew_factory(api_key, llm_cache=llm_cache)
+
+    if input_path == "-":
+        problems = list(read_batch(sys.stdin))
+    else:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            problems = list(read_batch(f))
+
+    output = sys.stdout if output_path == "-" else open(output_path, 'w', encoding='utf-8')
+    write_lock = threading.Lock()
+    failures = 0
+    try:
+        # Crew progress logs go to stderr so stdout stays valid JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagnosis") as pool:
+                futures = [
+                    pool.submit(diagnose, problem_id, problem, factory, prefetch, cancel_token, diagnosis_cache, similar_index, triage)
+                    for problem_id, problem in problems
+                ]
+                for future in as_completed(futures):
+                    record = future.result()
+                    if record["status"] != "ok":
+                        failures += 1
+                    with write_lock:
+                        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return failures
+
+def create_fleet_factory(addresses, llm_cache=None):
+    """A crew factory whose tool runs every command on all of `addresses` at once."""
+    from src.laptop_repair.crew import LaptopRepairCrewFactory
+    from src.laptop_repair.tools.custom_tool import SystemCommandTool
+    from src.laptop_repair.tools.remote import FleetCoordinator
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set. Please provide the API key.")
+    fleet = FleetCoordinator.from_addresses([address.strip() for address in addresses if address.strip()])
+    system_tool = SystemCommandTool(executor=fleet, target_platform=fleet.platform)
+    return LaptopRepairCrewFactory(api_key, system_tool=system_tool, llm_cache=llm_cache), fleet
+
+def print_startup_profile():
+    from src.laptop_repair.startup_profile import format_startup_report, measure_imports, seconds_since_process_start
+
+    stages = [("arguments parsed", seconds_since_process_start())]
+    timings = measure_imports()
+    stages.append(("crew stack imported", seconds_since_process_start()))
+    print(format_startup_report(stages, timings), file=sys.stderr)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -13,25 +124,156 @@ def main():
     parser.add_argument(
         "problem",
         type=str,
+        nargs="?",
         help="A description of the laptop problem to be diagnosed."
     )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Run the read-only diagnostic commands concurrently while the agent plans."
+    )
+    parser.add_argument(
+        "--triage",
+        action="store_true",
+        help="Run the commands matching the problem's keywords (slow, disk, network, battery, boot) before the agent starts."
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Diagnose every problem in a JSONL file ('-' for stdin) instead of a single problem."
+    )
+    parser.add_argument(
+        "--output",
+        default="-",
+        metavar="FILE",
+        help="Where batch results are written as JSONL (default: stdout)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of crews to run concurrently in batch mode."
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse stored diagnoses for the same problem on an unchanged system (SQLite in ~/.laptop_repair)."
+    )
+    parser.add_argument(
+        "--similar",
+        action="store_true",
+        help="Reuse or consult past diagnoses of similarly worded problems (local index in ~/.laptop_repair)."
+    )
+    parser.add_argument(
+        "--llm-cache",
+        action="store_true",
+        help="Answer byte-identical LLM requests from a local response cache (SQLite in ~/.laptop_repair)."
+    )
+    parser.add_argument(
+        "--llm-replay",
+        action="store_true",
+        help="Only use recorded LLM responses and fail on anything new; for offline runs and tests."
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Show the agent only what changed since the last diagnosis of this machine."
+    )
+    parser.add_argument(
+        "--hosts",
+        metavar="HOST:PORT,...",
+        help="Run the diagnostics on these remote agents (src.laptop_repair.remote_agent) instead of this machine."
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running."
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Print how long startup and the crewai/LLM imports take, then continue."
+    )
     args = parser.parse_args()
 
+    if args.hosts and args.batch:
+        parser.error("--hosts diagnoses one problem across the fleet and cannot be combined with --batch")
+    if args.hosts and (args.cache or args.similar or args.delta):
+        parser.error("--cache, --similar and --delta describe this machine and cannot be combined with --hosts")
+    if args.delta and args.batch:
+        parser.error("--delta compares one run with the previous run of this machine and cannot be combined with --batch")
+
+    if args.startup_profile:
+        print_startup_profile()
+        if not args.problem and not args.batch:
+            return
+
+    if args.metrics_port:
+        from src.laptop_repair.metrics import start_http_server
+        start_http_server(args.metrics_port)
+
+    cancel_token = CancellationToken()
+    install_sigint_cancellation(cancel_token)
+
+    diagnosis_cache = None
+    if args.cache:
+        from src.laptop_repair.diagnosis_cache import DiagnosisCache
+        diagnosis_cache = DiagnosisCache()
+
+    similar_index = None
+    if args.similar:
+        from src.laptop_repair.similar_diagnoses import SimilarDiagnosisIndex
+        similar_index = SimilarDiagnosisIndex()
+
+    llm_cache = None
+    if args.llm_cache or args.llm_replay:
+        from src.laptop_repair.llm_cache import LLMResponseCache
+        llm_cache = LLMResponseCache(replay=args.llm_replay)
+
+    snapshot_store = None
+    if args.delta:
+        from src.laptop_repair.tools.snapshots import SnapshotStore
+        snapshot_store = SnapshotStore()
+
+    if args.batch:
+        try:
+            failures = run_batch(args.batch, args.output, max(1, args.workers), prefetch=args.prefetch, cancel_token=cancel_token, diagnosis_cache=diagnosis_cache, similar_index=similar_index, triage=args.triage, llm_cache=llm_cache)
+        except Exception as e:
+            print(f"\nAn error occurred during the batch diagnosis: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(1 if failures else 0)
+
+    if not args.problem:
+        parser.error("either a problem description or --batch is required")
+
     print("================================================")
     print("=         Laptop Repair Crew Initialized       =")
     print("================================================")
     print(f"Analyzing problem: {args.problem}\n")
 
+    fleet = None
     try:
-        repair_crew = LaptopRepairCrew(args.problem)
-        result = repair_crew.run()
+        from src.laptop_repair.crew import LaptopRepairCrew
+        factory = None
+        if args.hosts:
+            factory, fleet = create_fleet_factory(args.hosts.split(","), llm_cache)
+            print(f"Collecting diagnostics from {len(fleet.executors)} hosts ({fleet.platform}).\n")
+        repair_crew = LaptopRepairCrew(args.problem, prefetch=args.prefetch and fleet is None, factory=factory, diagnosis_cache=diagnosis_cache, similar_index=similar_index, snapshot_store=snapshot_store, triage=args.triage, llm_cache=llm_cache)
+        result = repair_crew.run(cancel_token=cancel_token)
         print("\n\n================================================")
         print("=              Diagnosis Report              =")
         print("================================================")
         print(result)
 
+    except DiagnosisCancelled:
+        print("\nThe diagnosis was cancelled.")
+        sys.exit(130)
     except Exception as e:
         print(f"\nAn error occurred during the diagnosis process: {e}")
+    finally:
+        if fleet is not None:
+            fleet.close()
 
 if __name__ == "__main__":
     main()
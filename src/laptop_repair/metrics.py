@@ -0,0 +1,291 @@
+import platform
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.laptop_repair.events import add_listener
+from src.laptop_repair.tools.command_cache import command_cache, normalize_command
+
+# Seconds; spans cached answers (ms) up to the 180 s command timeout and slow LLM turns
+DEFAULT_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 180.0, 300.0)
+DIAGNOSIS_BUCKETS = (0.1, 1.0, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0, 180.0, 300.0, 600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a monotonic count kept by another object (e.g. the command cache)."""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [(self.name, self._labels(key), value) for key, value in series]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self.set_total(value, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (not yet cumulative) counts, then sum and count
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        samples = []
+        for key, (counts, total, count) in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_bucket", dict(labels, le="+Inf"), count))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        # Called before every scrape to refresh values owned by other objects
+        self._collectors = []
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, callback):
+        with self._lock:
+            self._collectors.append(callback)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for callback in collectors:
+            callback()
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+DIAGNOSES_STARTED = registry.counter(
+    "laptop_repair_diagnoses_started_total", "Diagnoses started.")
+DIAGNOSES_COMPLETED = registry.counter(
+    "laptop_repair_diagnoses_completed_total", "Diagnoses that returned a report, by where it came from.", ["source"])
+DIAGNOSES_FAILED = registry.counter(
+    "laptop_repair_diagnoses_failed_total", "Diagnoses that errored or were cancelled.", ["reason"])
+DIAGNOSIS_DURATION = registry.histogram(
+    "laptop_repair_diagnosis_duration_seconds", "Wall time of a diagnosis, by outcome.", ["outcome"], DIAGNOSIS_BUCKETS)
+DIAGNOSIS_CACHE_LOOKUPS = registry.counter(
+    "laptop_repair_diagnosis_cache_lookups_total", "Lookups in the diagnosis cache and similar-problem index.", ["cache", "result"])
+LLM_REQUEST_DURATION = registry.histogram(
+    "laptop_repair_llm_request_duration_seconds", "Latency of LLM requests.", ["model"])
+LLM_REQUEST_ERRORS = registry.counter(
+    "laptop_repair_llm_request_errors_total", "LLM requests that raised.", ["model"])
+LLM_CACHE_LOOKUPS = registry.counter(
+    "laptop_repair_llm_cache_lookups_total", "LLM requests answered from the response cache (hit), by joining an identical in-flight request (shared) or by the model (miss).", ["result"])
+CONTEXT_TOKENS_SAVED = registry.counter(
+    "laptop_repair_context_tokens_saved_total", "Estimated prompt tokens removed by condensing old tool observations.", ["model"])
+LLM_TOKENS = registry.counter(
+    "laptop_repair_llm_tokens_total", "Tokens reported by the LLM provider.", ["model", "kind"])
+COMMAND_DURATION = registry.histogram(
+    "laptop_repair_command_duration_seconds", "Latency of diagnostic tool calls, including cache hits.", ["command"])
+COMMAND_TIMEOUTS = registry.counter(
+    "laptop_repair_command_timeouts_total", "Diagnostic commands killed after the command timeout.", ["command"])
+COMMAND_CACHE_LOOKUPS = registry.counter(
+    "laptop_repair_command_cache_lookups_total", "Command result cache lookups.", ["result"])
+COMMAND_CACHE_HIT_RATIO = registry.gauge(
+    "laptop_repair_command_cache_hit_ratio", "Share of command result cache lookups that hit.")
+COMMAND_CACHE_BYTES = registry.gauge(
+    "laptop_repair_command_cache_bytes", "Bytes held by the command result cache.")
+
+
+def _collect_command_cache():
+    stats = command_cache.stats()
+    COMMAND_CACHE_LOOKUPS.set_total(stats["hits"], result="hit")
+    COMMAND_CACHE_LOOKUPS.set_total(stats["misses"], result="miss")
+    COMMAND_CACHE_HIT_RATIO.set(stats["hit_ratio"])
+    COMMAND_CACHE_BYTES.set(stats["bytes"])
+
+
+registry.add_collector(_collect_command_cache)
+
+
+def _command_label(command: str, system: str = None) -> str:
+    """
+    The normalized command if it is on the allowlist of `system` (the tool's target platform,
+    which differs from this host for remote runs), so arbitrary LLM text cannot create new series.
+    """
+    # custom_tool pulls in crewai; by the time commands run it is loaded anyway
+    from src.laptop_repair.tools.custom_tool import get_allowlist
+    normalized = normalize_command(command)
+    if normalized == "get_fix_commands" or get_allowlist(system or platform.system()).is_allowed(command):
+        return normalized
+    return "other"
+
+
+def _on_event(event):
+    data = event.data
+    if event.kind == "diagnosis_started":
+        DIAGNOSES_STARTED.inc()
+    elif event.kind == "diagnosis_finished":
+        DIAGNOSES_COMPLETED.inc(source=data["source"])
+        DIAGNOSIS_DURATION.observe(data["elapsed_s"], outcome="completed")
+    elif event.kind == "diagnosis_failed":
+        DIAGNOSES_FAILED.inc(reason="error")
+        DIAGNOSIS_DURATION.observe(data["elapsed_s"], outcome="failed")
+    elif event.kind == "diagnosis_cancelled":
+        DIAGNOSES_FAILED.inc(reason="cancelled")
+    elif event.kind == "diagnosis_cache_lookup":
+        DIAGNOSIS_CACHE_LOOKUPS.inc(cache=data["cache"], result="hit" if data["hit"] else "miss")
+    elif event.kind == "llm_call_finished":
+        model = data.get("model") or "unknown"
+        LLM_REQUEST_DURATION.observe(data["elapsed_s"], model=model)
+        if data.get("error"):
+            LLM_REQUEST_ERRORS.inc(model=model)
+        for kind in ("prompt", "completion"):
+            tokens = data.get(f"{kind}_tokens")
+            if tokens:
+                LLM_TOKENS.inc(tokens, model=model, kind=kind)
+    elif event.kind == "llm_cache_lookup":
+        LLM_CACHE_LOOKUPS.inc(result=data["result"])
+    elif event.kind == "context_compacted":
+        CONTEXT_TOKENS_SAVED.inc(data["saved_tokens"], model=data.get("model") or "unknown")
+    elif event.kind == "command_finished":
+        COMMAND_DURATION.observe(data["elapsed_s"], command=_command_label(data["command"], data.get("platform")))
+    elif event.kind == "command_timeout":
+        COMMAND_TIMEOUTS.inc(command=_command_label(data["command"], data.get("platform")))
+
+
+_installed = False
+_installed_lock = threading.Lock()
+
+
+def install():
+    """Start recording the standard metrics from diagnostic events. Safe to call repeatedly."""
+    global _installed
+    with _installed_lock:
+        if _installed:
+            return
+        _installed = True
+    add_listener(_on_event)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics_registry = registry
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.metrics_registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", metrics_registry: MetricsRegistry = registry) -> ThreadingHTTPServer:
+    """Serve `GET /metrics` on a daemon thread (localhost only by default) and start recording."""
+    install()
+    handler = type("MetricsHandler", (_MetricsHandler,), {"metrics_registry": metrics_registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
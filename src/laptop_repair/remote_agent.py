@@ -0,0 +1,122 @@
+"""
+Remote diagnostic agent: serves this machine's SystemCommandTool to a coordinator.
+
+    LAPTOP_REPAIR_AGENT_TOKEN=<secret> python -m src.laptop_repair.remote_agent --host 0.0.0.0 --port 8765
+
+    GET  /info   host name, platform and allowlist
+    POST /run    {"command": "..."} -> {"output": "...", "elapsed_s": ...}
+
+The local allowlist, caches, output limits and timeouts apply exactly as for a
+local crew; every request must carry the shared token as a bearer token.
+"""
+import argparse
+import hmac
+import json
+import os
+import platform
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.laptop_repair.tools.custom_tool import SystemCommandTool, get_allowlist
+from src.laptop_repair.tools.remote import AGENT_TOKEN_ENV, DEFAULT_AGENT_PORT
+
+MAX_REQUEST_BYTES = 16 * 1024
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the coordinator's pooled connections are reused
+    protocol_version = "HTTP/1.1"
+    tool: SystemCommandTool = None
+    token: str = ""
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path != "/info":
+            return self._send_json(404, {"error": "Not found."})
+        self._send_json(200, {
+            "host": platform.node(),
+            "platform": self.tool.target_platform,
+            "release": platform.release(),
+            "commands": get_allowlist(self.tool.target_platform).commands,
+        })
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) would block until the client closes the connection
+            return self._send_json(400, {"error": "Content-Length must be a non-negative integer."})
+        if length > MAX_REQUEST_BYTES:
+            return self._send_json(413, {"error": "Request too large."})
+        body = self.rfile.read(length)
+        if not self._authorized():
+            return
+        if self.path != "/run":
+            return self._send_json(404, {"error": "Not found."})
+        try:
+            command = json.loads(body).get("command")
+        except (ValueError, AttributeError):
+            command = None
+        if not isinstance(command, str):
+            return self._send_json(400, {"error": "A 'command' string is required."})
+        started = time.perf_counter()
+        # _run applies this machine's allowlist, whatever the coordinator checked
+        output = self.tool._run(command)
+        self._send_json(200, {"output": output, "elapsed_s": time.perf_counter() - started})
+
+    def _authorized(self) -> bool:
+        supplied = self.headers.get("Authorization", "")
+        if hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {self.token}".encode("utf-8")):
+            return True
+        self._send_json(401, {"error": "Missing or wrong agent token."})
+        return False
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+def create_agent_server(token: str, host: str = "127.0.0.1", port: int = DEFAULT_AGENT_PORT, tool: SystemCommandTool = None) -> ThreadingHTTPServer:
+    if not token:
+        raise ValueError(f"An agent token is required; set {AGENT_TOKEN_ENV} or pass --token.")
+    handler = type("BoundAgentRequestHandler", (AgentRequestHandler,), {"tool": tool or SystemCommandTool(), "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve this machine's allowlisted diagnostics to a fleet coordinator.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_AGENT_PORT)
+    parser.add_argument("--token", default=os.getenv(AGENT_TOKEN_ENV), help=f"Shared secret (default: ${AGENT_TOKEN_ENV}).")
+    args = parser.parse_args()
+
+    try:
+        server = create_agent_server(args.token, args.host, args.port)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Laptop Repair agent listening on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
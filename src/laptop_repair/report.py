@@ -0,0 +1,14 @@
+SCRIPT_START_MARKER = "--- BATCH SCRIPT START ---"
+SCRIPT_END_MARKER = "--- BATCH SCRIPT END ---"
+# The agent's JSON selection from the safe-fix catalog; fix_script renders it into the script
+FIX_PLAN_START_MARKER = "--- FIX PLAN START ---"
+FIX_PLAN_END_MARKER = "--- FIX PLAN END ---"
+
+
+def split_report(report: str):
+    """Split a final report into (diagnosis, batch script); the script is '' when there are no markers."""
+    if SCRIPT_START_MARKER not in report:
+        return report, ""
+    diagnosis, script_full = report.split(SCRIPT_START_MARKER, 1)
+    script = script_full.split(SCRIPT_END_MARKER)[0].strip()
+    return diagnosis, script
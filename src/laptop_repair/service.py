@@ -0,0 +1,378 @@
+"""
+Long-running HTTP/JSON front end for LaptopRepairCrew:
+
+    python -m src.laptop_repair.service --port 8080 --workers 4 --queue 100
+
+    POST   /diagnoses              {"problem": "..."} -> 202 {"id": ..., "status": "queued"}
+    GET    /diagnoses/<id>         status, and the report once done
+    GET    /diagnoses/<id>/events  progress as server-sent events until the job ends
+    DELETE /diagnoses/<id>         cancel a queued or running job
+    GET    /healthz, GET /metrics
+
+All jobs share one warm crew factory (LLM client, configs, tool) and the
+process-wide caches. A full queue is answered with 503 and Retry-After.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.laptop_repair.cancellation import CancellationToken, DiagnosisCancelled
+from src.laptop_repair.report import split_report
+
+MAX_REQUEST_BYTES = 64 * 1024
+MAX_PROBLEM_CHARS = 4000
+# Events kept per job for late /events subscribers; LLM tokens beyond this are dropped
+MAX_JOB_EVENTS = 5000
+# Finished jobs are forgotten after this long, or sooner once there are too many
+FINISHED_JOB_TTL = 60 * 60
+MAX_FINISHED_JOBS = 1000
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+_FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+class ServiceBusy(Exception):
+    """The job queue is full; the client should retry later."""
+
+
+class DiagnosisJob:
+    def __init__(self, problem: str):
+        self.id = uuid.uuid4().hex
+        self.problem = problem
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.report = None
+        # DiagnosisReport fields, when the agent's answer could be structured
+        self.structured = None
+        self.error = None
+        self.cancel_token = CancellationToken()
+        self.events = []
+        self.events_dropped = 0
+        self._changed = threading.Condition()
+
+    def add_event(self, event):
+        with self._changed:
+            if len(self.events) >= MAX_JOB_EVENTS:
+                self.events_dropped += 1
+                return
+            self.events.append({"kind": event.kind, "data": event.data, "timestamp": event.timestamp})
+            self._changed.notify_all()
+
+    def set_status(self, status: str, **fields):
+        with self._changed:
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._changed.notify_all()
+
+    def wait_for_events(self, after: int, timeout: float):
+        """Return (new events after index `after`, finished) once there is something new or on timeout."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > after or self.status in _FINAL_STATES, timeout)
+            return self.events[after:], self.status in _FINAL_STATES
+
+    def to_dict(self, position: int = None) -> dict:
+        result = {
+            "id": self.id,
+            "status": self.status,
+            "problem": self.problem,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if position is not None:
+            result["queue_position"] = position
+        if self.status == DONE:
+            diagnosis, script = split_report(self.report)
+            result.update(report=self.report, diagnosis=diagnosis.strip(), script=script)
+            if self.structured is not None:
+                result["structured"] = self.structured
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+class DiagnosisService:
+    """
+    Bounded job queue in front of `workers` threads that each run one crew at a time.
+    Crews are built from a single shared factory, so no job pays for crewai startup,
+    LLM client creation or config parsing.
+    """
+
+    def __init__(self, factory, workers: int = 4, max_queue: int = 100, prefetch: bool = False,
+                 diagnosis_cache=None, similar_index=None, triage: bool = False):
+        self.factory = factory
+        self.workers = workers
+        self.prefetch = prefetch
+        self.diagnosis_cache = diagnosis_cache
+        self.similar_index = similar_index
+        self.triage = triage
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"diagnosis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, cancel_running: bool = True):
+        self._stopping.set()
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status == QUEUED or (cancel_running and job.status == RUNNING):
+                job.cancel_token.cancel()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    def submit(self, problem: str) -> DiagnosisJob:
+        job = DiagnosisJob(problem)
+        with self._jobs_lock:
+            self._prune()
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._jobs_lock:
+                self._jobs.pop(job.id, None)
+            raise ServiceBusy()
+        return job
+
+    def get(self, job_id: str):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is not None and job.status not in _FINAL_STATES:
+            job.cancel_token.cancel()
+            if job.status == QUEUED:
+                job.set_status(CANCELLED, finished_at=time.time())
+        return job
+
+    def queue_position(self, job: DiagnosisJob):
+        if job.status != QUEUED:
+            return None
+        with self._jobs_lock:
+            queued = [j for j in self._jobs.values() if j.status == QUEUED]
+        return queued.index(job) if job in queued else None
+
+    def stats(self) -> dict:
+        with self._jobs_lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "queued": self._queue.qsize(), "max_queue": self._queue.maxsize, "jobs": counts}
+
+    def _worker(self):
+        from src.laptop_repair.crew import LaptopRepairCrew
+
+        while not self._stopping.is_set():
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.cancel_token.cancelled:
+                if job.status != CANCELLED:
+                    job.set_status(CANCELLED, finished_at=time.time())
+                continue
+            job.set_status(RUNNING, started_at=time.time())
+            try:
+                crew = LaptopRepairCrew(job.problem, prefetch=self.prefetch, factory=self.factory,
+                                        diagnosis_cache=self.diagnosis_cache, similar_index=self.similar_index,
+                                        triage=self.triage)
+                report = crew.run(on_event=job.add_event, cancel_token=job.cancel_token)
+                structured = crew.structured_report.model_dump() if crew.structured_report is not None else None
+                job.set_status(DONE, report=report, structured=structured, finished_at=time.time())
+            except DiagnosisCancelled:
+                job.set_status(CANCELLED, finished_at=time.time())
+            except Exception as e:
+                job.set_status(FAILED, error=str(e), finished_at=time.time())
+
+    def _prune(self):
+        """Forget old finished jobs; called with _jobs_lock held."""
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.status in _FINAL_STATES]
+        excess = len(finished) - MAX_FINISHED_JOBS
+        for job in finished:
+            if excess > 0 or now - job.finished_at > FINISHED_JOB_TTL:
+                del self._jobs[job.id]
+                excess -= 1
+
+
+class DiagnosisRequestHandler(BaseHTTPRequestHandler):
+    service: DiagnosisService = None
+    server_version = "LaptopRepair/0.1"
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/healthz":
+            return self._send_json(200, dict(self.service.stats(), status="ok"))
+        if path == "/metrics":
+            from src.laptop_repair.metrics import CONTENT_TYPE, registry
+            return self._send_body(200, registry.render().encode("utf-8"), CONTENT_TYPE)
+        parts = path.strip("/").split("/")
+        if len(parts) >= 2 and parts[0] == "diagnoses":
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {"error": "Unknown diagnosis id."})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict(self.service.queue_position(job)))
+            if len(parts) == 3 and parts[2] == "events":
+                return self._stream_events(job)
+        self._send_json(404, {"error": "Not found."})
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/diagnoses":
+            return self._send_json(404, {"error": "Not found."})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) would block until the client closes the connection
+            return self._send_json(400, {"error": "Content-Length must be a non-negative integer."})
+        if length > MAX_REQUEST_BYTES:
+            return self._send_json(413, {"error": f"Request body is limited to {MAX_REQUEST_BYTES} bytes."})
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "Request body must be JSON."})
+        problem = body.get("problem") if isinstance(body, dict) else None
+        if not isinstance(problem, str) or not problem.strip():
+            return self._send_json(400, {"error": "A non-empty 'problem' string is required."})
+        if len(problem) > MAX_PROBLEM_CHARS:
+            return self._send_json(400, {"error": f"'problem' is limited to {MAX_PROBLEM_CHARS} characters."})
+        try:
+            job = self.service.submit(problem.strip())
+        except ServiceBusy:
+            return self._send_json(503, {"error": "The diagnosis queue is full, retry later."}, {"Retry-After": "10"})
+        self._send_json(202, job.to_dict(self.service.queue_position(job)), {"Location": f"/diagnoses/{job.id}"})
+
+    def do_DELETE(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "diagnoses":
+            return self._send_json(404, {"error": "Not found."})
+        job = self.service.cancel(parts[1])
+        if job is None:
+            return self._send_json(404, {"error": "Unknown diagnosis id."})
+        self._send_json(202, job.to_dict())
+
+    def _stream_events(self, job: DiagnosisJob):
+        """Server-sent events: one 'data:' line per DiagnosticEvent, then a final 'status' event."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                events, finished = job.wait_for_events(sent, timeout=15)
+                for event in events:
+                    self.wfile.write(f"event: {event['kind']}\ndata: {json.dumps(event, default=str)}\n\n".encode("utf-8"))
+                sent += len(events)
+                if finished:
+                    self.wfile.write(f"event: status\ndata: {json.dumps({'status': job.status})}\n\n".encode("utf-8"))
+                    return
+                if not events:
+                    # Keeps proxies from closing an idle stream while the LLM thinks
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        self._send_body(status, json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"), "application/json", headers)
+
+    def _send_body(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+def create_server(service: DiagnosisService, host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    handler = type("BoundDiagnosisRequestHandler", (DiagnosisRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Laptop Repair Crew diagnoses over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only).")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="Diagnoses run concurrently.")
+    parser.add_argument("--queue", type=int, default=100, help="Jobs that may wait for a worker before 503s are returned.")
+    parser.add_argument("--prefetch", action="store_true", help="Run the read-only diagnostics while the agent plans.")
+    parser.add_argument("--triage", action="store_true", help="Run the commands matching each problem's keywords before its agent starts.")
+    parser.add_argument("--stream", action="store_true", help="Stream LLM tokens to /events subscribers.")
+    parser.add_argument("--cache", action="store_true", help="Reuse stored diagnoses for repeat problems on an unchanged system.")
+    parser.add_argument("--similar", action="store_true", help="Reuse or consult past diagnoses of similarly worded problems.")
+    parser.add_argument("--llm-cache", action="store_true", help="Answer byte-identical LLM requests from a local response cache.")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("GEMINI_API_KEY environment variable not set.")
+
+    from src.laptop_repair.crew import get_crew_factory
+    from src.laptop_repair.metrics import install as install_metrics
+
+    install_metrics()
+    llm_cache = None
+    if args.llm_cache:
+        from src.laptop_repair.llm_cache import LLMResponseCache
+        llm_cache = LLMResponseCache()
+    # Build the LLM client, configs and tool once, before the first request arrives
+    factory = get_crew_factory(api_key, stream=args.stream, llm_cache=llm_cache)
+
+    diagnosis_cache = None
+    if args.cache:
+        from src.laptop_repair.diagnosis_cache import DiagnosisCache
+        diagnosis_cache = DiagnosisCache()
+
+    similar_index = None
+    if args.similar:
+        from src.laptop_repair.similar_diagnoses import SimilarDiagnosisIndex
+        similar_index = SimilarDiagnosisIndex()
+
+    service = DiagnosisService(factory, workers=max(1, args.workers), max_queue=max(1, args.queue), prefetch=args.prefetch,
+                               diagnosis_cache=diagnosis_cache, similar_index=similar_index, triage=args.triage)
+    service.start()
+    server = create_server(service, args.host, args.port)
+    print(f"Laptop Repair service listening on http://{args.host}:{server.server_address[1]} with {service.workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
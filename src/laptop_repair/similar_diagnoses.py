@@ -0,0 +1,184 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+from src.laptop_repair.diagnosis_cache import DEFAULT_CACHE_DIR
+from src.laptop_repair.report import split_report
+
+DEFAULT_DIM = 2048
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Help-desk vocabulary folded onto one term so common paraphrases share features
+_CANONICAL_TERMS = {
+    "pc": "computer", "laptop": "computer", "notebook": "computer", "machine": "computer",
+    "sluggish": "slow", "laggy": "slow", "lag": "slow", "lagging": "slow", "slowly": "slow",
+    "wireless": "wifi", "wi": "wifi", "wlan": "wifi", "internet": "network", "connection": "network",
+    "drops": "dropping", "disconnects": "dropping", "disconnecting": "dropping",
+    "storage": "disk", "drive": "disk", "ssd": "disk", "hdd": "disk",
+    "bsod": "bluescreen", "crash": "crashes", "crashing": "crashes",
+    "charge": "battery", "charging": "battery", "drain": "drains", "draining": "drains",
+    "hot": "overheating", "overheats": "overheating", "fan": "overheating",
+    "freeze": "freezes", "freezing": "freezes", "hangs": "freezes", "hanging": "freezes",
+}
+
+
+@dataclass
+class SimilarDiagnosis:
+    score: float
+    problem: str
+    report: str
+    created_at: float
+    # fingerprint_hash() of the system the report was written for; None for older entries
+    fingerprint: Optional[str] = None
+
+
+class HashedNgramVectorizer:
+    """
+    Offline text embedder: word unigrams/bigrams and character 3-5 grams are hashed
+    into a fixed number of buckets with a sign bit and log-scaled term frequency.
+    crc32 is used instead of hash() so vectors are stable across processes.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = [_CANONICAL_TERMS.get(w, w) for w in _WORD_RE.findall(text.lower())]
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            for n in (3, 4, 5):
+                features += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        # Sublinear TF keeps repeated words from dominating short problem texts
+        return np.sign(vector) * np.log1p(np.abs(vector))
+
+
+class SimilarDiagnosisIndex:
+    """
+    Append-only cosine index over past (problem description, report) pairs.
+
+    On disk it is a directory holding `vectors.f32` (raw float32 rows, memory-mapped
+    for search), `entries.jsonl` (one record per row) and `df.npy` (document
+    frequency per bucket, used for IDF weighting at query time).
+    """
+
+    def __init__(self, path: str = None, dim: int = DEFAULT_DIM):
+        if path is None:
+            path = os.path.join(os.getenv("LAPTOP_REPAIR_CACHE_DIR", DEFAULT_CACHE_DIR), "similar")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.dim = dim
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._entries_path = os.path.join(path, "entries.jsonl")
+        self._df_path = os.path.join(path, "df.npy")
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, problem: str, report: str, fingerprint: str = None):
+        vector = self.vectorizer.transform(problem)
+        entry = {"problem": problem, "report": report, "created_at": time.time(), "fingerprint": fingerprint}
+        with self._lock:
+            with open(self._vectors_path, "ab") as f:
+                f.write(vector.astype(np.float32).tobytes())
+            with open(self._entries_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._df += (vector != 0)
+            np.save(self._df_path, self._df)
+            self._entries.append(entry)
+            self._map_vectors()
+
+    def search(self, problem: str, k: int = 3) -> List[SimilarDiagnosis]:
+        with self._lock:
+            vectors, entries, df = self._vectors, list(self._entries), self._df.copy()
+        if vectors is None or not entries:
+            return []
+        count = min(len(entries), vectors.shape[0])
+        idf = np.log((1.0 + count) / (1.0 + df)).astype(np.float32) + 1.0
+        query = self.vectorizer.transform(problem) * idf
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+        matrix = vectors[:count] * idf
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (matrix @ query) / (norms * query_norm)
+        top = np.argsort(-scores)[:k]
+        return [
+            SimilarDiagnosis(
+                score=float(scores[i]),
+                problem=entries[i]["problem"],
+                report=entries[i]["report"],
+                created_at=entries[i]["created_at"],
+                fingerprint=entries[i].get("fingerprint"),
+            )
+            for i in top
+        ]
+
+    def best_match(self, problem: str, threshold: float) -> Optional[SimilarDiagnosis]:
+        matches = self.search(problem, k=1)
+        if matches and matches[0].score >= threshold:
+            return matches[0]
+        return None
+
+    def format_context(self, matches: List[SimilarDiagnosis], max_chars: int = 1200) -> str:
+        """Condense matches into prompt context: the past problem and the diagnosis part of its report."""
+        blocks = []
+        for match in matches:
+            diagnosis, _ = split_report(match.report)
+            diagnosis = diagnosis.strip()
+            if len(diagnosis) > max_chars:
+                diagnosis = diagnosis[:max_chars] + " ..."
+            blocks.append(f"[similarity {match.score:.2f}] Problem: {match.problem}\n{diagnosis}")
+        return "\n\n".join(blocks)
+
+    def _load(self):
+        self._entries = []
+        if os.path.exists(self._entries_path):
+            with open(self._entries_path, "rb") as f:
+                complete = 0
+                for line in f:
+                    # A line without its newline was torn by a crash mid-append; it is cut off
+                    # below so the next append starts on a fresh line
+                    if not line.endswith(b"\n"):
+                        break
+                    complete += len(line)
+                    if line.strip():
+                        self._entries.append(json.loads(line))
+            if complete < os.path.getsize(self._entries_path):
+                os.truncate(self._entries_path, complete)
+        if os.path.exists(self._df_path):
+            self._df = np.load(self._df_path)
+        else:
+            self._df = np.zeros(self.dim, dtype=np.float32)
+        # add() writes the vector before the entry, so a crash in between leaves a vector
+        # row without an entry; cut it off, or every later entry would get its predecessor's row
+        row_bytes = self.dim * 4
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > len(self._entries) * row_bytes:
+            os.truncate(self._vectors_path, len(self._entries) * row_bytes)
+        self._map_vectors()
+
+    def _map_vectors(self):
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = size // row_bytes
+        if rows == 0:
+            self._vectors = None
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
@@ -0,0 +1,57 @@
+import importlib
+import sys
+import time
+
+# The modules that dominate cold start, in dependency order so each timing is
+# the incremental cost on top of the ones before it.
+HEAVY_MODULES = (
+    "yaml",
+    "pydantic",
+    "litellm",
+    "crewai",
+    "src.laptop_repair.crew",
+)
+
+
+def seconds_since_process_start() -> float:
+    """Wall time since the interpreter (or frozen exe) was launched, if psutil can tell."""
+    try:
+        import psutil
+        return time.time() - psutil.Process().create_time()
+    except Exception:
+        return float("nan")
+
+
+def measure_imports(modules=HEAVY_MODULES) -> list:
+    """Import `modules` one after another and return (name, seconds, already_loaded) tuples."""
+    timings = []
+    for name in modules:
+        already_loaded = name in sys.modules
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            timings.append((name, float("nan"), False))
+            continue
+        timings.append((name, time.perf_counter() - started, already_loaded))
+    return timings
+
+
+def format_startup_report(stages: list, import_timings: list) -> str:
+    """Render startup stages [(label, seconds since launch)] and import timings as text."""
+    lines = ["=== Startup profile ==="]
+    for label, seconds in stages:
+        lines.append(f"{label:<32} {seconds * 1000:9.1f} ms")
+    if import_timings:
+        lines.append("--- incremental import cost ---")
+        total = 0.0
+        for name, seconds, already_loaded in import_timings:
+            if seconds != seconds:
+                lines.append(f"{name:<32} {'not installed':>12}")
+                continue
+            total += seconds
+            note = " (already loaded)" if already_loaded else ""
+            lines.append(f"{name:<32} {seconds * 1000:9.1f} ms{note}")
+        lines.append(f"{'total':<32} {total * 1000:9.1f} ms")
+    lines.append("For a per-module tree run: python -X importtime -c \"import src.laptop_repair.crew\"")
+    return "\n".join(lines)
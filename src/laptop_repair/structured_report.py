@@ -0,0 +1,78 @@
+import json
+import re
+from typing import List
+from pydantic import BaseModel, Field, ValidationError
+from src.laptop_repair.fix_script import FixPlan, FixSelection, render_fix_script
+from src.laptop_repair.report import SCRIPT_END_MARKER, SCRIPT_START_MARKER
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+class DiagnosisReport(BaseModel):
+    """The system_analysis_task's final answer; the fix script is rendered locally from `fixes`."""
+    problem_summary: str = Field(description="A brief restatement of the user's issue.")
+    findings: List[str] = Field(default_factory=list, description="What the diagnostic command output showed, one finding per item.")
+    diagnosis: str = Field(description="A clear conclusion about the root cause.")
+    proposed_solution: str = Field(description="What the selected fixes will do, in plain words.")
+    fixes: List[FixSelection] = Field(default_factory=list, description="Fix categories from get_fix_commands; empty when no fix applies.")
+    restart: bool = Field(default=False, description="Whether the user should restart after the fixes.")
+
+    def fix_plan(self) -> FixPlan:
+        return FixPlan(fixes=self.fixes, restart=self.restart)
+
+
+def parse_report(text: str) -> DiagnosisReport:
+    """
+    Validate an answer as a DiagnosisReport. Tolerates a ``` fence or prose around the
+    JSON object; raises ValueError with the validation details otherwise.
+    """
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("The answer contains no JSON object.")
+    try:
+        return DiagnosisReport.model_validate(json.loads(text[start:end + 1]))
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise ValueError(str(e)) from e
+
+
+def reformat_messages(answer: str, error: str) -> list:
+    """
+    Messages for a formatting-only retry: the LLM restructures the finished answer
+    against the schema and is told not to change its content or investigate further.
+    """
+    schema = json.dumps(DiagnosisReport.model_json_schema(), indent=2)
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You convert a finished laptop diagnosis into JSON. Do not add, remove or change any findings, "
+                "conclusions or fixes, and do not ask for more information. Reply with only a JSON object "
+                f"that matches this schema:\n{schema}"
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"The previous answer failed validation:\n{error}\n\nAnswer to convert:\n{answer}",
+        },
+    ]
+
+
+def render_diagnosis(report: DiagnosisReport) -> str:
+    findings = "\n".join(f"- {finding}" for finding in report.findings) or "- None recorded."
+    return (
+        f"**Problem Summary:** {report.problem_summary}\n\n"
+        f"**Investigation & Analysis:**\n{findings}\n\n"
+        f"**Final Diagnosis:** {report.diagnosis}\n\n"
+        f"**Proposed Solution:** {report.proposed_solution}\n"
+    )
+
+
+def render_report(report: DiagnosisReport, system: str) -> str:
+    """The text report used everywhere else, with the script between markers this code writes itself."""
+    text = render_diagnosis(report)
+    if report.fixes:
+        text += f"\n{SCRIPT_START_MARKER}\n{render_fix_script(report.fix_plan(), system)}\n{SCRIPT_END_MARKER}\n"
+    return text
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+# TTL (seconds) per command class. Static inventory barely changes during a
+# session, volatile state is only worth reusing within the same agent turn.
+# Integrity checks (sfc, dism) get the default TTL: a fix script exists to change them.
+# So does systeminfo, which also reports available memory, page file use and boot time.
+STATIC_TTL = 6 * 60 * 60
+DEFAULT_TTL = 5 * 60
+VOLATILE_TTL = 15
+
+_STATIC_PREFIXES = (
+    "lscpu",
+    "lsblk",
+    "lsusb",
+    "lspci",
+    "uname",
+    "bcdedit",
+    "wmic cpu",
+    "wmic memorychip",
+    "wmic diskdrive",
+    "wmic qfe",
+    "powershell get-wmiobject -class win32_physicalmemory",
+)
+
+_VOLATILE_PREFIXES = (
+    "tasklist",
+    "ps aux",
+    "top -bn1",
+    "netstat",
+    "free",
+    "df",
+    "wmic process",
+    "wmic temperature",
+    "wmic logicaldisk",
+    # Answered by the native collector with used/free memory, not just the total
+    "wmic computersystem",
+    "dir %temp%",
+    "dmesg",
+    "journalctl",
+)
+
+
+def normalize_command(command: str) -> str:
+    """Normalize a command string so equivalent invocations share a cache key."""
+    return " ".join(command.strip().lower().split())
+
+
+def ttl_for_command(command: str) -> float:
+    """Return the cache lifetime in seconds for a (normalized) command."""
+    normalized = normalize_command(command)
+    if normalized.startswith(_STATIC_PREFIXES):
+        return STATIC_TTL
+    if normalized.startswith(_VOLATILE_PREFIXES):
+        return VOLATILE_TTL
+    return DEFAULT_TTL
+
+
+class CommandResultCache:
+    """Thread-safe TTL cache of command results with LRU eviction by total output size."""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, command: str):
+        key = normalize_command(command)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, command: str, value: str, ttl: float = None):
+        key = normalize_command(command)
+        if ttl is None:
+            ttl = ttl_for_command(key)
+        size = len(value.encode("utf-8", errors="ignore"))
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, command: str = None):
+        """Drop one command's entry, or everything when no command is given."""
+        with self._lock:
+            if command is None:
+                self._entries.clear()
+                self._total_bytes = 0
+            else:
+                key = normalize_command(command)
+                if key in self._entries:
+                    self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+
+
+# Process-wide cache shared by every SystemCommandTool instance.
+command_cache = CommandResultCache()
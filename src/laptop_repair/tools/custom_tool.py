@@ -1,13 +1,31 @@
+import asyncio
+import re
 import subprocess
 import platform
+import time
 import os
+import signal
 import tempfile
-from typing import Type
+from typing import Any, Optional, Type
+import psutil
 from pydantic import BaseModel, Field
 from crewai.tools import BaseTool
+from src.laptop_repair.events import emit
+from src.laptop_repair.tracing import annotate, span
+from src.laptop_repair.tools.command_cache import command_cache, normalize_command
+from src.laptop_repair.tools.prefetch import diagnostic_prefetcher
+from src.laptop_repair.tools.parsers import summarize_output
+from src.laptop_repair.tools.native_collector import collect_native
+from src.laptop_repair.tools.output_capture import (
+    DEFAULT_MAX_OUTPUT_BYTES,
+    DEFAULT_MAX_OUTPUT_LINES,
+    BoundedOutput,
+    pump_stream_async,
+    start_pump_thread,
+)
 
-def _get_allowed_commands():
-    if platform.system() == "Windows":
+def _get_allowed_commands(system: str = None):
+    if (system or platform.system()) == "Windows":
         return [
             "systeminfo",
             "tasklist",
@@ -50,8 +68,85 @@ def _get_allowed_commands():
             "lspci",
         ]
 
-def _get_safe_fix_commands():
-    if platform.system() == "Windows":
+def _get_allowed_command_patterns(system: str = None):
+    """Argument variants of allowlisted commands, e.g. a different line count."""
+    if (system or platform.system()) == "Windows":
+        return [
+            r"powershell get-eventlog -logname (system|application) -entrytype (error|warning) -newest \d{1,3}",
+        ]
+    else:
+        return [
+            r"dmesg \| tail -(n )?\d{1,3}",
+            r"journalctl -xe --no-pager -n \d{1,3}",
+            r"top -bn1 \| head -(n )?\d{1,3}",
+        ]
+
+# Tabs, newlines or runs of spaces: the shell would not read these as one plain command
+_UNSAFE_WHITESPACE_RE = re.compile(r"[^\S ]| {2,}")
+
+class CommandAllowlist:
+    """Allowlist index keyed by first token, checked against the whole normalized command."""
+
+    def __init__(self, commands, patterns=()):
+        self.commands = list(commands)
+        # first token -> {normalized command: allowlist entry}
+        self._exact = {}
+        self._patterns = {}
+        for cmd in self.commands:
+            normalized = normalize_command(cmd)
+            self._exact.setdefault(normalized.split()[0], {})[normalized] = cmd
+        for pattern in patterns:
+            first = pattern.split()[0]
+            self._patterns.setdefault(first, []).append(re.compile(pattern + r"$"))
+        self.listing = "\n".join(f"  - {cmd}" for cmd in self.commands)
+
+    def resolve(self, command: str) -> Optional[str]:
+        """
+        The command to execute for `command`: its allowlist entry, or the normalized form
+        for a pattern match. None if it is not allowed or is spaced other than with single spaces.
+        """
+        if _UNSAFE_WHITESPACE_RE.search(command.strip()):
+            return None
+        normalized = normalize_command(command)
+        if not normalized:
+            return None
+        first = normalized.split()[0]
+        entry = self._exact.get(first, {}).get(normalized)
+        if entry is not None:
+            return entry
+        if any(pattern.match(normalized) for pattern in self._patterns.get(first, ())):
+            return normalized
+        return None
+
+    def is_allowed(self, command: str) -> bool:
+        return self.resolve(command) is not None
+
+_PLATFORM = platform.system()
+_ALLOWLIST = CommandAllowlist(_get_allowed_commands(), _get_allowed_command_patterns())
+_ALLOWLISTS = {_PLATFORM: _ALLOWLIST}
+
+def get_allowlist(system: str) -> CommandAllowlist:
+    """Allowlist for `system` (a platform.system() name), built once per platform."""
+    allowlist = _ALLOWLISTS.get(system)
+    if allowlist is None:
+        allowlist = CommandAllowlist(_get_allowed_commands(system), _get_allowed_command_patterns(system))
+        _ALLOWLISTS[system] = allowlist
+    return allowlist
+
+# Allowlisted commands that are too slow or have side effects (powercfg writes
+# a report file) to start speculatively before the agent asks for them.
+_PREFETCH_EXCLUDED = (
+    "sfc /verifyonly",
+    "dism /online /cleanup-image /checkhealth",
+    "powercfg /batteryreport",
+    "wmic process get name,commandline,processid",
+)
+
+def _get_prefetch_commands():
+    return [cmd for cmd in _get_allowed_commands() if cmd not in _PREFETCH_EXCLUDED]
+
+def _get_safe_fix_commands(system: str = None):
+    if (system or platform.system()) == "Windows":
         return {
             "disk_cleanup": [
                 "cleanmgr /sagerun:1",
@@ -111,8 +206,43 @@ def _get_safe_fix_commands():
             ]
         }
 
+COMMAND_TIMEOUT = 180
+
+# Matches the banner _format_output puts in front of every command's output
+OUTPUT_HEADER_RE = re.compile(r"\A--- Command Output for .* ---\nSystem: .*\n\n")
+
+# On POSIX every command gets its own process group so the shell's children
+# can be killed together with it.
+_POPEN_GROUP_KWARGS = {} if platform.system() == "Windows" else {"start_new_session": True}
+
+def kill_process_tree(pid: int):
+    """Kill a process and everything it spawned (e.g. cmd.exe -> wmic, sh -> sleep)."""
+    try:
+        parent = psutil.Process(pid)
+        procs = parent.children(recursive=True) + [parent]
+    except psutil.Error:
+        # The shell has exited, but what it started may still run and hold its pipes open
+        procs = [proc for proc in psutil.process_iter(["ppid"]) if proc.info["ppid"] == pid]
+    for proc in procs:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+    if platform.system() != "Windows":
+        # Orphans are re-parented away from the shell but stay in its process group
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+async def _kill_async_process(process):
+    # Also when the shell has exited: a grandchild holding the pipes is what kept us waiting
+    kill_process_tree(process.pid)
+    if process.returncode is None:
+        await process.wait()
+
 class SystemCommandInput(BaseModel):
-    command: str = Field(description=f"The specific, safe command to execute. Must be one of the approved diagnostic commands or 'get_fix_commands' to retrieve available fix commands.")
+    command: str = Field(description=f"The specific, safe command to execute. Must exactly match one of the approved diagnostic commands or 'get_fix_commands' to retrieve available fix commands.")
 
 class SystemCommandTool(BaseTool):
     name: str = "System Diagnostic Command Executor"
@@ -122,92 +252,355 @@ class SystemCommandTool(BaseTool):
     Use 'get_fix_commands' to retrieve available repair commands.
     """
     args_schema: Type[BaseModel] = SystemCommandInput
+    # Output budget per stream; the head and tail are kept, the middle is dropped
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES
+    max_output_lines: int = DEFAULT_MAX_OUTPUT_LINES
+    # Write the complete output of truncated commands to a temp file
+    spill_output: bool = False
+    # Replace the raw dump of commands with a registered parser by a compact table
+    structured_output: bool = True
+    # Answer process/memory/disk/network commands through psutil instead of a subprocess
+    use_native: bool = True
+    # CancellationToken of the diagnosis this tool instance serves, if any
+    cancel_token: Optional[Any] = Field(default=None, exclude=True)
+    # SnapshotStore for delta mode: static inventory is reused, the rest is diffed against last run
+    snapshot_store: Optional[Any] = Field(default=None, exclude=True)
+    # OS whose allowlist and fix catalog apply; differs from the host when replaying or running remotely
+    target_platform: str = _PLATFORM
+    # Runs allowed commands elsewhere (RemoteExecutor, FleetCoordinator); None runs them on this machine
+    executor: Optional[Any] = Field(default=None, exclude=True)
+    # ObservationCompactor of the diagnosis; shortens what is returned to the agent
+    observation_compactor: Optional[Any] = Field(default=None, exclude=True)
+    # DiagnosticPrefetcher of the diagnosis; None uses the process-wide one
+    prefetcher: Optional[Any] = Field(default=None, exclude=True)
 
     def _run(self, command: str) -> str:
+        emit("command_started", command=command)
+        started = time.perf_counter()
+        with span("tool.run", "tool", command=command) as current:
+            result = self._compact(command, self._dispatch(command))
+            current.set(output_chars=len(result))
+        emit("command_finished", command=command, platform=self.target_platform, elapsed_s=time.perf_counter() - started, output_chars=len(result))
+        return result
+
+    async def _arun(self, command: str) -> str:
+        emit("command_started", command=command)
+        started = time.perf_counter()
+        with span("tool.run", "tool", command=command) as current:
+            result = self._compact(command, await self._dispatch_async(command))
+            current.set(output_chars=len(result))
+        emit("command_finished", command=command, platform=self.target_platform, elapsed_s=time.perf_counter() - started, output_chars=len(result))
+        return result
+
+    def _dispatch(self, command: str) -> str:
         try:
-            if command.lower() == "get_fix_commands":
-                fix_commands = _get_safe_fix_commands()
-                result = f"Available safe fix command categories for {platform.system()}:\n\n"
-                for category, commands in fix_commands.items():
-                    result += f"{category.upper().replace('_', ' ')}:\n"
-                    for cmd in commands:
-                        result += f"  - {cmd}\n"
-                    result += "\n"
-                return result
-
-            allowed_commands = _get_allowed_commands()
-            command_allowed = False
-            for allowed_cmd in allowed_commands:
-                if command.lower().startswith(allowed_cmd.lower().split()[0]):
-                    command_allowed = True
-                    break
-                    
-            if not command_allowed:
-                return f"Error: The command '{command}' is not permitted for security reasons.\n\nAllowed commands for {platform.system()}:\n" + "\n".join(f"  - {cmd}" for cmd in allowed_commands)
-
-            if command.lower().startswith("powershell "):
-                if platform.system() == "Windows":
-                    ps_command = command[11:]
-                    full_command = ["powershell", "-Command", ps_command]
-                else:
-                    return "Error: PowerShell commands are only available on Windows systems."
-            else:
-                full_command = command
-
-            if platform.system() == "Windows":
-                if isinstance(full_command, str):
-                    process = subprocess.Popen(
-                        full_command,
-                        shell=True,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        encoding='utf-8',
-                        errors='ignore'
-                    )
-                else:
-                    process = subprocess.Popen(
-                        full_command,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        encoding='utf-8',
-                        errors='ignore'
-                    )
-            else:
-                process = subprocess.Popen(
-                    full_command,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='ignore'
-                )
-
-            try:
-                stdout, stderr = process.communicate(timeout=180)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                return f"Error: The command '{command}' timed out after 180 seconds."
-
-            if process.returncode != 0 and stderr:
-                if stdout:
-                    return f"Command completed with warnings.\nWarnings: {stderr.strip()}\n\nOutput:\n{stdout}"
-                else:
-                    return f"Command failed with error: {stderr.strip()}"
-
-            if stdout.strip():
-                return f"--- Command Output for '{command}' ---\nSystem: {platform.system()} {platform.release()}\n\n{stdout}"
+            if self._cancelled():
+                return self._cancelled_message(command)
+
+            rejection = self._preflight(command)
+            if rejection is not None:
+                return rejection
+            # Run the allowlist's own spelling, never the raw string the agent sent
+            command = get_allowlist(self.target_platform).resolve(command)
+
+            if self.executor is not None:
+                # The remote side has its own caches; the local ones would mix up hosts
+                annotate(source="remote")
+                return self.executor.run(command)
+
+            cached = command_cache.get(command)
+            if cached is not None:
+                annotate(source="cache")
+                # In delta mode a repeat (e.g. of a triage command) is diffed and recorded like a fresh run
+                return self._record_snapshot(command, cached)
+
+            if self.snapshot_store is not None:
+                reused = self.snapshot_store.reuse_static(command)
+                if reused is not None:
+                    annotate(source="snapshot")
+                    return reused
+
+            result = self._prefetcher().join(command)
+            if result is None:
+                result = self._execute_and_cache(command)
             else:
-                return f"Command '{command}' executed successfully but returned no output."
+                annotate(source="prefetch")
+
+            return self._record_snapshot(command, result)
+
+        except Exception as e:
+            return self._describe_error(command, e)
+
+    async def _dispatch_async(self, command: str) -> str:
+        try:
+            if self._cancelled():
+                return self._cancelled_message(command)
+
+            rejection = self._preflight(command)
+            if rejection is not None:
+                return rejection
+            # Run the allowlist's own spelling, never the raw string the agent sent
+            command = get_allowlist(self.target_platform).resolve(command)
+
+            if self.executor is not None:
+                annotate(source="remote")
+                return await asyncio.to_thread(self.executor.run, command)
+
+            cached = command_cache.get(command)
+            if cached is not None:
+                annotate(source="cache")
+                # In delta mode a repeat (e.g. of a triage command) is diffed and recorded like a fresh run
+                return self._record_snapshot(command, cached)
+
+            if self.snapshot_store is not None:
+                reused = self.snapshot_store.reuse_static(command)
+                if reused is not None:
+                    annotate(source="snapshot")
+                    return reused
+
+            result = None
+            future = self._prefetcher().take(command)
+            if future is not None:
+                try:
+                    result = await asyncio.wrap_future(future)
+                    annotate(source="prefetch")
+                except Exception:
+                    pass
+
+            if result is None:
+                result, cacheable = await self._execute_async(command)
+                if cacheable:
+                    command_cache.put(command, result)
+
+            return self._record_snapshot(command, result)
+
+        except Exception as e:
+            return self._describe_error(command, e)
 
-        except FileNotFoundError:
+    def _record_snapshot(self, command: str, result: str) -> str:
+        if self.snapshot_store is None:
+            return result
+        return self.snapshot_store.record(command, result)
+
+    def _compact(self, command: str, result: str) -> str:
+        if self.observation_compactor is None:
+            return result
+        return self.observation_compactor.compact(command, result)
+
+    def prefetch(self, commands=None):
+        """Start the read-only diagnostics concurrently so later _run calls find them ready."""
+        if commands is None:
+            commands = _get_prefetch_commands()
+        self._prefetcher().start(commands, self._execute_and_cache)
+
+    def _prefetcher(self):
+        return self.prefetcher if self.prefetcher is not None else diagnostic_prefetcher
+
+    def _cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def _cancelled_message(self, command: str) -> str:
+        return f"Error: The diagnosis was cancelled; '{command}' was stopped."
+
+    def _watch_cancellation(self, pid: int):
+        """Kill the process tree as soon as the diagnosis is cancelled; returns the callback to unregister."""
+        if self.cancel_token is None:
+            return None
+        return self.cancel_token.add_callback(lambda: kill_process_tree(pid))
+
+    def _unwatch_cancellation(self, callback):
+        if callback is not None:
+            self.cancel_token.remove_callback(callback)
+
+    def _preflight(self, command: str):
+        """Answer 'get_fix_commands' or reject disallowed commands; None means the command may run."""
+        if normalize_command(command) == "get_fix_commands":
+            fix_commands = _get_safe_fix_commands(self.target_platform)
+            result = f"Available safe fix command categories for {self.target_platform}:\n\n"
+            for category, commands in fix_commands.items():
+                result += f"{category.upper().replace('_', ' ')}:\n"
+                for cmd in commands:
+                    result += f"  - {cmd}\n"
+                result += "\n"
+            return result
+
+        allowlist = get_allowlist(self.target_platform)
+        if not allowlist.is_allowed(command):
+            return f"Error: The command '{command}' is not permitted for security reasons.\n\nAllowed commands for {self.target_platform}:\n" + allowlist.listing
+
+        if command.lower().startswith("powershell ") and self.target_platform != "Windows":
+            return "Error: PowerShell commands are only available on Windows systems."
+
+        return None
+
+    def _describe_error(self, command: str, error: Exception) -> str:
+        if isinstance(error, FileNotFoundError):
             return f"Error: The command '{command}' was not found on this system. This may indicate the required tool is not installed."
-        except PermissionError:
+        if isinstance(error, PermissionError):
             return f"Error: Permission denied executing '{command}'. This command may require administrator/root privileges."
-        except Exception as e:
-            return f"An unexpected error occurred while running '{command}': {str(e)}"
+        return f"An unexpected error occurred while running '{command}': {str(error)}"
+
+    def _build_command(self, command: str):
+        """Return the argv list for PowerShell commands, or the shell string otherwise."""
+        if command.lower().startswith("powershell ") and _PLATFORM == "Windows":
+            return ["powershell", "-Command", command[11:]]
+        return command
+
+    def _format_result(self, command: str, returncode: int, stdout: str, stderr: str):
+        """Map a finished process to (output, cacheable)."""
+        if returncode != 0 and stderr:
+            if stdout:
+                return f"Command completed with warnings.\nWarnings: {stderr.strip()}\n\nOutput:\n{stdout}", True
+            else:
+                return f"Command failed with error: {stderr.strip()}", False
+
+        if stdout.strip():
+            if self.structured_output:
+                stdout = summarize_output(command, stdout) or stdout
+            return self._format_output(command, stdout), True
+        else:
+            return f"Command '{command}' executed successfully but returned no output.", True
+
+    def _new_capture(self) -> BoundedOutput:
+        return BoundedOutput(
+            max_bytes=self.max_output_bytes,
+            max_lines=self.max_output_lines,
+            spill=self.spill_output,
+        )
+
+    def _format_output(self, command: str, body: str) -> str:
+        return f"--- Command Output for '{command}' ---\nSystem: {platform.system()} {platform.release()}\n\n{body}"
+
+    def _collect_native(self, command: str):
+        if not self.use_native:
+            return None
+        native = collect_native(command)
+        if native is None:
+            return None
+        return self._format_output(command, native)
+
+    def _execute_and_cache(self, command: str) -> str:
+        result, cacheable = self._execute(command)
+        if cacheable:
+            command_cache.put(command, result)
+        return result
+
+    def _execute(self, command: str):
+        """Run an already-validated command, returning (output, cacheable)."""
+        native = self._collect_native(command)
+        if native is not None:
+            annotate(source="native")
+            return native, True
+
+        full_command = self._build_command(command)
+
+        if isinstance(full_command, str):
+            process = subprocess.Popen(
+                full_command,
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+                **_POPEN_GROUP_KWARGS
+            )
+        else:
+            process = subprocess.Popen(
+                full_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+                **_POPEN_GROUP_KWARGS
+            )
+
+        stdout = self._new_capture()
+        stderr = self._new_capture()
+        readers = [
+            start_pump_thread(process.stdout, stdout),
+            start_pump_thread(process.stderr, stderr),
+        ]
+
+        cancel_callback = self._watch_cancellation(process.pid)
+        deadline = time.monotonic() + COMMAND_TIMEOUT
+        try:
+            process.wait(timeout=COMMAND_TIMEOUT)
+            # A grandchild that outlives the shell keeps the pipes open; it gets the rest of the timeout
+            for reader in readers:
+                reader.join(timeout=5 if self._cancelled() else max(0.0, deadline - time.monotonic()))
+            timed_out = any(reader.is_alive() for reader in readers)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        finally:
+            self._unwatch_cancellation(cancel_callback)
+
+        if timed_out:
+            kill_process_tree(process.pid)
+            process.wait()
+            for reader in readers:
+                reader.join(timeout=5)
+            if not self._cancelled():
+                emit("command_timeout", command=command, platform=self.target_platform, timeout_s=COMMAND_TIMEOUT)
+                return f"Error: The command '{command}' timed out after {COMMAND_TIMEOUT} seconds.", False
+
+        if self._cancelled():
+            return self._cancelled_message(command), False
+
+        annotate(source="subprocess", exit_code=process.returncode, stdout_bytes=stdout.total_bytes, stderr_bytes=stderr.total_bytes)
+        return self._format_result(command, process.returncode, stdout.text(), stderr.text())
+
+    async def _execute_async(self, command: str):
+        """Asyncio counterpart of _execute; no thread is held while the child runs."""
+        native = self._collect_native(command)
+        if native is not None:
+            annotate(source="native")
+            return native, True
+
+        full_command = self._build_command(command)
+
+        if isinstance(full_command, str):
+            process = await asyncio.create_subprocess_shell(
+                full_command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **_POPEN_GROUP_KWARGS,
+            )
+        else:
+            process = await asyncio.create_subprocess_exec(
+                *full_command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **_POPEN_GROUP_KWARGS,
+            )
+
+        stdout = self._new_capture()
+        stderr = self._new_capture()
+        capture = asyncio.gather(
+            pump_stream_async(process.stdout, stdout),
+            pump_stream_async(process.stderr, stderr),
+            process.wait(),
+        )
+
+        cancel_callback = self._watch_cancellation(process.pid)
+        try:
+            await asyncio.wait_for(capture, timeout=COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            emit("command_timeout", command=command, platform=self.target_platform, timeout_s=COMMAND_TIMEOUT)
+            await _kill_async_process(process)
+            return f"Error: The command '{command}' timed out after {COMMAND_TIMEOUT} seconds.", False
+        except asyncio.CancelledError:
+            await _kill_async_process(process)
+            raise
+        finally:
+            self._unwatch_cancellation(cancel_callback)
+
+        if self._cancelled():
+            return self._cancelled_message(command), False
+
+        annotate(source="subprocess", exit_code=process.returncode, stdout_bytes=stdout.total_bytes, stderr_bytes=stderr.total_bytes)
+        return self._format_result(command, process.returncode, stdout.text(), stderr.text())
 
     def get_system_info(self) -> str:
         """Get basic system information for debugging purposes."""
@@ -229,12 +622,10 @@ class SystemCommandTool(BaseTool):
             return f"Unable to retrieve system information: {str(e)}"
 
     def get_safe_fix_commands(self):
-        return _get_safe_fix_commands()
+        return _get_safe_fix_commands(self.target_platform)
 
     def validate_command_safety(self, command: str) -> bool:
-        allowed_commands = _get_allowed_commands()
-        return any(command.lower().startswith(allowed_cmd.lower().split()[0]) 
-                  for allowed_cmd in allowed_commands)
+        return get_allowlist(self.target_platform).is_allowed(command)
 
     def get_os_specific_diagnostics(self) -> str:
         os_name = platform.system()
@@ -0,0 +1,133 @@
+import socket
+import time
+from typing import Optional
+import psutil
+from src.laptop_repair.tools.command_cache import normalize_command
+from src.laptop_repair.tools.parsers import (
+    OUTPUT_PARSERS,
+    DiskVolume,
+    MemoryUsage,
+    NetConnection,
+    ProcessInfo,
+    render_records,
+)
+
+
+def _collect_processes(with_cpu: bool):
+    now = time.time()
+    processes = []
+    attrs = ["pid", "name", "username", "memory_info", "cpu_times", "create_time"]
+    for proc in psutil.process_iter(attrs):
+        info = proc.info
+        memory = info.get("memory_info")
+        cpu_pct = None
+        cpu_times = info.get("cpu_times")
+        create_time = info.get("create_time")
+        # Lifetime average, the same figure `ps aux` reports in %CPU
+        if with_cpu and cpu_times is not None and create_time:
+            elapsed = max(now - create_time, 1e-3)
+            cpu_pct = round((cpu_times.user + cpu_times.system) * 100 / elapsed, 1)
+        processes.append(ProcessInfo(
+            name=info.get("name") or "",
+            pid=info["pid"],
+            memory_bytes=memory.rss if memory is not None else None,
+            cpu_pct=cpu_pct,
+            user=info.get("username") or "",
+        ))
+    return processes
+
+
+def _collect_memory(include_swap: bool = True):
+    vm = psutil.virtual_memory()
+    usages = [MemoryUsage(
+        kind="mem",
+        total_bytes=vm.total,
+        used_bytes=vm.used,
+        free_bytes=vm.free,
+        available_bytes=vm.available,
+    )]
+    if include_swap:
+        swap = psutil.swap_memory()
+        usages.append(MemoryUsage(
+            kind="swap",
+            total_bytes=swap.total,
+            used_bytes=swap.used,
+            free_bytes=swap.free,
+        ))
+    return usages
+
+
+def _collect_disks():
+    volumes = []
+    for part in psutil.disk_partitions(all=False):
+        try:
+            usage = psutil.disk_usage(part.mountpoint)
+        except OSError:
+            # Empty card readers / optical drives on Windows are "not ready"
+            continue
+        volumes.append(DiskVolume(
+            name=part.mountpoint,
+            size_bytes=usage.total,
+            used_bytes=usage.used,
+            free_bytes=usage.free,
+            used_pct=usage.percent,
+            device=part.device,
+        ))
+    return volumes
+
+
+def _format_addr(addr) -> str:
+    if not addr:
+        return ""
+    return f"{addr.ip}:{addr.port}"
+
+
+def _collect_connections(listening_only: bool):
+    connections = []
+    for conn in psutil.net_connections(kind="inet"):
+        proto = "tcp" if conn.type == socket.SOCK_STREAM else "udp"
+        if listening_only and proto == "tcp" and conn.status != psutil.CONN_LISTEN:
+            continue
+        if listening_only and proto == "udp" and conn.raddr:
+            continue
+        connections.append(NetConnection(
+            proto=proto,
+            local=_format_addr(conn.laddr),
+            remote=_format_addr(conn.raddr),
+            status=conn.status if conn.status != psutil.CONN_NONE else "",
+            pid=conn.pid,
+        ))
+    return connections
+
+
+def _listening_first(record):
+    return (record.status == "LISTEN", record.proto == "tcp")
+
+
+# Allowlisted commands that can be answered in-process: collector, sort key, row limit.
+NATIVE_COLLECTORS = {
+    "ps aux": (lambda: _collect_processes(with_cpu=True), OUTPUT_PARSERS["ps aux"].sort_key, 25),
+    "tasklist": (lambda: _collect_processes(with_cpu=False), OUTPUT_PARSERS["tasklist"].sort_key, 25),
+    "free -h": (_collect_memory, None, None),
+    "wmic computersystem get totalphysicalmemory": (lambda: _collect_memory(include_swap=False), None, None),
+    "df -h": (_collect_disks, None, None),
+    "wmic logicaldisk get size,freespace,caption": (_collect_disks, None, None),
+    "netstat -an": (lambda: _collect_connections(listening_only=False), _listening_first, 60),
+    "netstat -tuln": (lambda: _collect_connections(listening_only=True), None, 60),
+}
+
+
+def collect_native(command: str) -> Optional[str]:
+    """Answer `command` through psutil, or return None so the caller spawns the real command."""
+    entry = NATIVE_COLLECTORS.get(normalize_command(command))
+    if entry is None:
+        return None
+    collector, sort_key, limit = entry
+    try:
+        records = collector()
+    except (psutil.Error, OSError):
+        # e.g. AccessDenied for net_connections on macOS without root
+        return None
+    if not records:
+        return None
+    return render_records(records, sort_key=sort_key, limit=limit, label="Collected")
@@ -0,0 +1,141 @@
+import codecs
+import os
+import tempfile
+import threading
+from collections import deque
+
+DEFAULT_MAX_OUTPUT_BYTES = 64 * 1024
+DEFAULT_MAX_OUTPUT_LINES = 400
+READ_CHUNK_SIZE = 8192
+
+
+class BoundedOutput:
+    """Incrementally captures a stream, keeping only its head and tail within a byte/line budget.
+
+    Lines that fall between the head and the tail are counted and discarded. When
+    `spill` is set the complete stream is also written to a temp file so nothing is
+    lost, and `spill_path` points at it once something has been truncated.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, max_lines: int = DEFAULT_MAX_OUTPUT_LINES, spill: bool = False):
+        self.head_bytes = max_bytes // 2
+        self.head_lines = max(1, max_lines // 2)
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.tail_lines = max(1, max_lines - self.head_lines)
+        self.max_line_chars = max(80, self.tail_bytes)
+
+        self.head = []
+        self.tail = deque()
+        self._head_size = 0
+        self._tail_size = 0
+        self._head_full = False
+        self._partial = ""
+
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.dropped_lines = 0
+        self.dropped_bytes = 0
+
+        self.spill_path = None
+        self._spill = None
+        if spill:
+            self._spill = tempfile.NamedTemporaryFile(
+                mode="w", encoding="utf-8", errors="ignore",
+                prefix="laptop_repair_", suffix=".log", delete=False,
+            )
+            self.spill_path = self._spill.name
+
+    def write(self, chunk: str):
+        """Feed a chunk of text; it need not end on a line boundary."""
+        if not chunk:
+            return
+        if self._spill is not None:
+            self._spill.write(chunk)
+        data = self._partial + chunk
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line + "\n")
+        # A single unterminated line must not grow without bound either
+        if len(self._partial) > self.max_line_chars:
+            self._add_line(self._partial)
+            self._partial = ""
+
+    def close(self):
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = ""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            if not self.truncated:
+                os.unlink(self.spill_path)
+                self.spill_path = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped_lines > 0
+
+    def text(self) -> str:
+        if not self.truncated:
+            return "".join(self.head) + "".join(self.tail)
+        marker = f"\n... [{self.dropped_lines} lines ({self.dropped_bytes} bytes) truncated"
+        if self.spill_path:
+            marker += f"; full output saved to {self.spill_path}"
+        marker += "] ...\n\n"
+        return "".join(self.head) + marker + "".join(self.tail)
+
+    def _add_line(self, line: str):
+        if len(line) > self.max_line_chars:
+            line = line[:self.max_line_chars] + " [line clipped]\n"
+        size = len(line.encode("utf-8", errors="ignore"))
+        self.total_lines += 1
+        self.total_bytes += size
+
+        if not self._head_full:
+            if len(self.head) < self.head_lines and self._head_size + size <= self.head_bytes:
+                self.head.append(line)
+                self._head_size += size
+                return
+            self._head_full = True
+
+        self.tail.append(line)
+        self._tail_size += size
+        while len(self.tail) > 1 and (len(self.tail) > self.tail_lines or self._tail_size > self.tail_bytes):
+            dropped = self.tail.popleft()
+            dropped_size = len(dropped.encode("utf-8", errors="ignore"))
+            self._tail_size -= dropped_size
+            self.dropped_lines += 1
+            self.dropped_bytes += dropped_size
+
+
+def pump_stream(stream, output: BoundedOutput):
+    """Drain a text-mode pipe into `output` until EOF."""
+    try:
+        for chunk in iter(lambda: stream.read(READ_CHUNK_SIZE), ""):
+            output.write(chunk)
+    except (OSError, ValueError):
+        # Pipe closed underneath us, e.g. after the process was killed
+        pass
+    finally:
+        output.close()
+
+
+def start_pump_thread(stream, output: BoundedOutput) -> threading.Thread:
+    thread = threading.Thread(target=pump_stream, args=(stream, output), daemon=True)
+    thread.start()
+    return thread
+
+
+async def pump_stream_async(reader, output: BoundedOutput):
+    """Drain an asyncio StreamReader into `output` until EOF."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    try:
+        while True:
+            data = await reader.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            output.write(decoder.decode(data))
+        output.write(decoder.decode(b"", final=True))
+    finally:
+        output.close()
@@ -0,0 +1,376 @@
+import re
+from dataclasses import dataclass, fields
+from typing import Callable, List, Optional
+from src.laptop_repair.tools.command_cache import normalize_command
+
+
+@dataclass(slots=True)
+class SystemSummary:
+    os_name: str = ""
+    os_version: str = ""
+    manufacturer: str = ""
+    model: str = ""
+    processor: str = ""
+    total_memory_mb: Optional[int] = None
+    available_memory_mb: Optional[int] = None
+    boot_time: str = ""
+    hotfixes: Optional[int] = None
+    # Every other field of the output (hotfix list, network cards, page file, ...) as "Key: value; ..."
+    other: str = ""
+
+
+@dataclass(slots=True)
+class DiskVolume:
+    name: str
+    size_bytes: Optional[int] = None
+    used_bytes: Optional[int] = None
+    free_bytes: Optional[int] = None
+    used_pct: Optional[float] = None
+    device: str = ""
+
+
+@dataclass(slots=True)
+class BlockDevice:
+    name: str
+    size_bytes: Optional[int] = None
+    type: str = ""
+    mountpoint: str = ""
+
+
+@dataclass(slots=True)
+class MemoryUsage:
+    kind: str
+    total_bytes: Optional[int] = None
+    used_bytes: Optional[int] = None
+    free_bytes: Optional[int] = None
+    available_bytes: Optional[int] = None
+
+
+@dataclass(slots=True)
+class MemoryModule:
+    manufacturer: str = ""
+    capacity_bytes: Optional[int] = None
+    speed_mhz: Optional[int] = None
+
+
+@dataclass(slots=True)
+class ProcessInfo:
+    name: str
+    pid: int
+    memory_bytes: Optional[int] = None
+    cpu_pct: Optional[float] = None
+    user: str = ""
+
+
+@dataclass(slots=True)
+class NetConnection:
+    proto: str
+    local: str
+    remote: str = ""
+    status: str = ""
+    pid: Optional[int] = None
+
+
+@dataclass(slots=True)
+class OutputParser:
+    """A registry entry: how to parse one command and which records matter most."""
+    parse: Callable[[str], list]
+    sort_key: Optional[Callable] = None
+    limit: Optional[int] = None
+
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4, "P": 1024 ** 5}
+_SIZE_RE = re.compile(r"^([\d.,]+)\s*([KMGTP]?)(?:I?B|I)?$", re.IGNORECASE)
+
+
+def _to_int(value: str) -> Optional[int]:
+    digits = re.sub(r"[^\d]", "", value or "")
+    return int(digits) if digits else None
+
+
+def _parse_size(value: str) -> Optional[int]:
+    """Parse human-readable sizes such as '1.5G', '512Mi' or '980K' into bytes."""
+    match = _SIZE_RE.match((value or "").strip())
+    if not match:
+        return None
+    number = float(match.group(1).replace(",", "."))
+    return int(number * _SIZE_UNITS[match.group(2).upper()])
+
+
+def _human_size(num_bytes: Optional[int]) -> str:
+    if num_bytes is None:
+        return "-"
+    size = float(num_bytes)
+    for unit in ("B", "K", "M", "G", "T"):
+        if size < 1024 or unit == "T":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def _fixed_width_rows(text: str, header_index: int = 0) -> List[dict]:
+    """Split a column-aligned table (wmic style) using the header's column offsets."""
+    lines = [line.rstrip() for line in text.splitlines() if line.strip()]
+    if len(lines) <= header_index:
+        return []
+    header = lines[header_index]
+    starts = [m.start() for m in re.finditer(r"\S+", header)]
+    names = [m.group(0).lower() for m in re.finditer(r"\S+", header)]
+    rows = []
+    for line in lines[header_index + 1:]:
+        if line.startswith("..."):
+            continue
+        row = {}
+        for i, name in enumerate(names):
+            end = starts[i + 1] if i + 1 < len(starts) else None
+            row[name] = line[starts[i]:end].strip()
+        rows.append(row)
+    return rows
+
+
+# systeminfo fields that have their own SystemSummary column
+_SYSTEMINFO_FIELDS = (
+    "OS Name",
+    "OS Version",
+    "System Manufacturer",
+    "System Model",
+    "Processor(s)",
+    "Total Physical Memory",
+    "Available Physical Memory",
+    "System Boot Time",
+)
+
+
+def parse_systeminfo(text: str) -> List[SystemSummary]:
+    pairs = []
+    unparsed = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if line[0].isspace():
+            # Continuation of a multi-line field, e.g. "  [01]: Intel64 Family 6 ..." under Processor(s)
+            if pairs:
+                pairs[-1][1] = f"{pairs[-1][1]} {line.strip()}".strip()
+            else:
+                unparsed.append(line.strip())
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            unparsed.append(line.strip())
+            continue
+        pairs.append([key.strip(), " ".join(value.split())])
+    if not pairs:
+        return []
+    values = {}
+    for key, value in pairs:
+        values.setdefault(key, value)
+    hotfixes = _to_int(values["Hotfix(s)"].split("Hotfix")[0]) if "Hotfix(s)" in values else None
+    other = [f"{key}: {value}" for key, value in pairs if key not in _SYSTEMINFO_FIELDS] + unparsed
+    return [SystemSummary(
+        os_name=values.get("OS Name", ""),
+        os_version=values.get("OS Version", ""),
+        manufacturer=values.get("System Manufacturer", ""),
+        model=values.get("System Model", ""),
+        processor=values.get("Processor(s)", ""),
+        total_memory_mb=_to_int(values.get("Total Physical Memory", "")),
+        available_memory_mb=_to_int(values.get("Available Physical Memory", "")),
+        boot_time=values.get("System Boot Time", ""),
+        hotfixes=hotfixes,
+        other="; ".join(other),
+    )]
+
+
+def parse_wmic_logicaldisk(text: str) -> List[DiskVolume]:
+    volumes = []
+    for row in _fixed_width_rows(text):
+        if not row.get("caption"):
+            continue
+        size = _to_int(row.get("size", ""))
+        free = _to_int(row.get("freespace", ""))
+        used = size - free if size is not None and free is not None else None
+        volumes.append(DiskVolume(
+            name=row["caption"],
+            size_bytes=size,
+            used_bytes=used,
+            free_bytes=free,
+            used_pct=round(used * 100 / size, 1) if used is not None and size else None,
+        ))
+    return volumes
+
+
+def parse_df(text: str) -> List[DiskVolume]:
+    volumes = []
+    for line in text.splitlines()[1:]:
+        parts = line.split(None, 5)
+        if len(parts) < 6 or not parts[4].endswith("%"):
+            continue
+        device, size, used, avail, pct, mount = parts
+        volumes.append(DiskVolume(
+            name=mount,
+            size_bytes=_parse_size(size),
+            used_bytes=_parse_size(used),
+            free_bytes=_parse_size(avail),
+            used_pct=float(pct.rstrip("%")) if pct.rstrip("%").isdigit() else None,
+            device=device,
+        ))
+    return volumes
+
+
+def parse_free(text: str) -> List[MemoryUsage]:
+    usages = []
+    for line in text.splitlines():
+        label, sep, rest = line.partition(":")
+        if not sep or label.strip() not in ("Mem", "Swap"):
+            continue
+        parts = rest.split()
+        usages.append(MemoryUsage(
+            kind=label.strip().lower(),
+            total_bytes=_parse_size(parts[0]) if len(parts) > 0 else None,
+            used_bytes=_parse_size(parts[1]) if len(parts) > 1 else None,
+            free_bytes=_parse_size(parts[2]) if len(parts) > 2 else None,
+            available_bytes=_parse_size(parts[5]) if len(parts) > 5 else None,
+        ))
+    return usages
+
+
+def parse_lsblk(text: str) -> List[BlockDevice]:
+    devices = []
+    for line in text.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 6:
+            continue
+        devices.append(BlockDevice(
+            name=parts[0].lstrip("├─└│ "),
+            size_bytes=_parse_size(parts[3]),
+            type=parts[5],
+            mountpoint=parts[6] if len(parts) > 6 else "",
+        ))
+    return devices
+
+
+def parse_wmic_memorychip(text: str) -> List[MemoryModule]:
+    return [
+        MemoryModule(
+            manufacturer=row.get("manufacturer", ""),
+            capacity_bytes=_to_int(row.get("capacity", "")),
+            speed_mhz=_to_int(row.get("speed", "")),
+        )
+        for row in _fixed_width_rows(text)
+        if row.get("capacity")
+    ]
+
+
+def parse_tasklist(text: str) -> List[ProcessInfo]:
+    lines = text.splitlines()
+    separator = next((i for i, line in enumerate(lines) if line.startswith("=====")), None)
+    if separator is None:
+        return []
+    spans = [(m.start(), m.end()) for m in re.finditer(r"=+", lines[separator])]
+    if len(spans) < 5:
+        return []
+    processes = []
+    for line in lines[separator + 1:]:
+        if not line.strip() or line.startswith("..."):
+            continue
+        name = line[spans[0][0]:spans[0][1]].strip()
+        pid = _to_int(line[spans[1][0]:spans[1][1]])
+        if not name or pid is None:
+            continue
+        memory_kb = _to_int(line[spans[4][0]:])
+        processes.append(ProcessInfo(
+            name=name,
+            pid=pid,
+            memory_bytes=memory_kb * 1024 if memory_kb is not None else None,
+        ))
+    return processes
+
+
+def parse_ps_aux(text: str) -> List[ProcessInfo]:
+    processes = []
+    for line in text.splitlines()[1:]:
+        parts = line.split(None, 10)
+        if len(parts) < 11 or not parts[1].isdigit():
+            continue
+        try:
+            cpu = float(parts[2])
+        except ValueError:
+            cpu = None
+        rss_kb = _to_int(parts[5])
+        processes.append(ProcessInfo(
+            name=parts[10][:80],
+            pid=int(parts[1]),
+            memory_bytes=rss_kb * 1024 if rss_kb is not None else None,
+            cpu_pct=cpu,
+            user=parts[0],
+        ))
+    return processes
+
+
+def _by_memory(record):
+    return record.memory_bytes or 0
+
+
+def _by_cpu_then_memory(record):
+    return (record.cpu_pct or 0.0, record.memory_bytes or 0)
+
+
+# Parsers keyed on the normalized allowlisted command they understand.
+OUTPUT_PARSERS = {
+    "systeminfo": OutputParser(parse_systeminfo),
+    "wmic logicaldisk get size,freespace,caption": OutputParser(parse_wmic_logicaldisk),
+    "wmic memorychip get capacity,speed,manufacturer": OutputParser(parse_wmic_memorychip),
+    "tasklist": OutputParser(parse_tasklist, sort_key=_by_memory, limit=25),
+    "df -h": OutputParser(parse_df),
+    "free -h": OutputParser(parse_free),
+    "lsblk": OutputParser(parse_lsblk),
+    "ps aux": OutputParser(parse_ps_aux, sort_key=_by_cpu_then_memory, limit=25),
+}
+
+
+def parse_output(command: str, text: str) -> Optional[list]:
+    """Parse a command's raw output into typed records, or None if there is no parser for it."""
+    parser = OUTPUT_PARSERS.get(normalize_command(command))
+    if parser is None:
+        return None
+    try:
+        return parser.parse(text)
+    except (ValueError, IndexError):
+        return None
+
+
+def _format_value(name: str, value) -> str:
+    if name.endswith("_bytes"):
+        return _human_size(value)
+    if value is None or value == "":
+        return "-"
+    return str(value).replace("|", "/")
+
+
+def render_records(records: list, sort_key: Optional[Callable] = None, limit: Optional[int] = None, label: str = "Parsed") -> str:
+    """Render records as a compact pipe-separated table."""
+    total = len(records)
+    if sort_key is not None:
+        records = sorted(records, key=sort_key, reverse=True)
+    if limit is not None:
+        records = records[:limit]
+
+    # Columns that no record fills in (e.g. cpu_pct for tasklist) only cost tokens
+    names = [
+        f.name for f in fields(records[0])
+        if any(getattr(record, f.name) not in (None, "") for record in records)
+    ]
+    lines = [" | ".join(name.replace("_bytes", "") for name in names)]
+    for record in records:
+        lines.append(" | ".join(_format_value(name, getattr(record, name)) for name in names))
+    summary = f"{label} {total} record(s)"
+    if total > len(records):
+        summary += f", showing top {len(records)}"
+    return summary + ":\n" + "\n".join(lines) + "\n"
+
+
+def summarize_output(command: str, text: str) -> Optional[str]:
+    """Render a compact table of parsed records, or None to fall back to the raw text."""
+    records = parse_output(command, text)
+    if not records:
+        return None
+    parser = OUTPUT_PARSERS[normalize_command(command)]
+    return render_records(records, sort_key=parser.sort_key, limit=parser.limit)
@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.laptop_repair.tools.command_cache import normalize_command, ttl_for_command
+
+
+class DiagnosticPrefetcher:
+    """Runs independent diagnostic commands concurrently on a bounded thread pool.
+
+    Results are handed back to whoever asks for the same command first, either
+    straight away if the command has finished or by joining its in-flight future.
+    A result is only handed out while it is younger than its command's cache TTL.
+    """
+
+    def __init__(self, max_workers: int = 6):
+        self.max_workers = max_workers
+        self._executor = None
+        # normalized command -> (future, submitted_at)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def start(self, commands, runner):
+        """Submit every command that is not already pending. `runner(command)` must return a string."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="diag-prefetch",
+                )
+            for command in commands:
+                key = normalize_command(command)
+                if key not in self._futures:
+                    self._futures[key] = (self._executor.submit(runner, command), time.monotonic())
+
+    def join(self, command: str, timeout: float = None):
+        """Return the prefetched result for `command`, waiting if it is still running.
+
+        Returns None when the command was never prefetched or the prefetch failed,
+        so the caller can fall back to running it directly.
+        """
+        future = self.take(command)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return None
+
+    def take(self, command: str):
+        """Detach and return the future for `command`, or None if it was not prefetched or is stale."""
+        key = normalize_command(command)
+        with self._lock:
+            entry = self._futures.pop(key, None)
+        if entry is None:
+            return None
+        future, submitted_at = entry
+        if time.monotonic() - submitted_at > ttl_for_command(key):
+            return None
+        return future
+
+    def pending(self) -> list:
+        with self._lock:
+            return [key for key, (future, _) in self._futures.items() if not future.done()]
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures, self._futures = self._futures, {}
+        for future, _ in futures.values():
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# Used by SystemCommandTool instances without a prefetcher of their own; each
+# LaptopRepairCrew run gets its own so concurrent runs never take each other's results.
+diagnostic_prefetcher = DiagnosticPrefetcher()
@@ -0,0 +1,155 @@
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterator, List
+
+# Shared secret between the coordinator and the agents (sent as a bearer token)
+AGENT_TOKEN_ENV = "LAPTOP_REPAIR_AGENT_TOKEN"
+DEFAULT_AGENT_PORT = 8765
+# Agents enforce the 180 s command timeout themselves; this only covers the network
+REQUEST_TIMEOUT = 180 + 30
+
+
+class RemoteAgentError(Exception):
+    """The agent could not be reached or answered with an error status."""
+
+
+@dataclass
+class HostResult:
+    host: str
+    command: str
+    output: str
+    elapsed_s: float
+
+
+class RemoteExecutor:
+    """
+    Runs allowlisted commands on one host through its remote agent
+    (`python -m src.laptop_repair.remote_agent`). Keeps a pool of keep-alive
+    connections and allows at most `max_concurrency` commands in flight.
+    """
+
+    def __init__(self, address: str, token: str = None, max_concurrency: int = 4, timeout: float = REQUEST_TIMEOUT):
+        host, _, port = address.rpartition(":")
+        if not host:
+            host, port = address, str(DEFAULT_AGENT_PORT)
+        self.name = address
+        self.host = host
+        self.port = int(port)
+        self.token = token or os.getenv(AGENT_TOKEN_ENV, "")
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._connections = queue.LifoQueue()
+        self._info = None
+
+    def info(self) -> dict:
+        """The agent's host name, platform and allowlist, fetched once."""
+        if self._info is None:
+            self._info = self._request("GET", "/info")
+        return self._info
+
+    @property
+    def platform(self) -> str:
+        return self.info()["platform"]
+
+    def run(self, command: str) -> str:
+        return self._request("POST", "/run", {"command": command})["output"]
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _request(self, method: str, path: str, payload: dict = None) -> dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        with self._slots:
+            # A pooled connection may have been closed by the agent; retry once on a fresh one
+            for attempt in range(2):
+                connection = self._acquire() if attempt == 0 else self._connect()
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    if attempt == 1:
+                        raise RemoteAgentError(f"{self.name} is unreachable: {e}") from e
+                    continue
+                self._connections.put(connection)
+                break
+        if response.status != 200:
+            raise RemoteAgentError(f"{self.name} answered {response.status}: {data.decode('utf-8', 'replace')[:200]}")
+        return json.loads(data)
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+
+class FleetCoordinator:
+    """
+    Fans commands out to many RemoteExecutors at once. Used as a SystemCommandTool
+    executor, one agent command returns every host's output in a single observation,
+    so a fleet takes about as long as its slowest host.
+    """
+
+    def __init__(self, executors: List[RemoteExecutor], max_workers: int = 32):
+        self.executors = list(executors)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet")
+
+    @classmethod
+    def from_addresses(cls, addresses, token: str = None, max_concurrency: int = 4, **kwargs) -> "FleetCoordinator":
+        return cls([RemoteExecutor(address, token, max_concurrency) for address in addresses], **kwargs)
+
+    @property
+    def platform(self) -> str:
+        """The fleet's OS; mixed fleets are rejected because one allowlist must fit every host."""
+        platforms = {info["platform"] for info in self._pool.map(lambda e: e.info(), self.executors)}
+        if len(platforms) != 1:
+            raise ValueError(f"The fleet mixes platforms {sorted(platforms)}; run one crew per platform.")
+        return platforms.pop()
+
+    def stream(self, commands) -> Iterator[HostResult]:
+        """Run every command on every host, yielding results as they complete."""
+        futures = [
+            self._pool.submit(self._run_one, executor, command)
+            for command in commands
+            for executor in self.executors
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def run(self, command: str) -> str:
+        """Run one command fleet-wide and merge the outputs, one section per host."""
+        results = {result.host: result for result in self.stream([command])}
+        sections = []
+        for executor in self.executors:
+            result = results[executor.name]
+            sections.append(f"=== Host: {executor.name} ({result.elapsed_s:.1f} s) ===\n{result.output.strip()}\n")
+        return "\n".join(sections)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for executor in self.executors:
+            executor.close()
+
+    def _run_one(self, executor: RemoteExecutor, command: str) -> HostResult:
+        started = time.perf_counter()
+        try:
+            output = executor.run(command)
+        except RemoteAgentError as e:
+            output = f"Error: {e}"
+        return HostResult(executor.name, command, output, time.perf_counter() - started)
@@ -0,0 +1,187 @@
+import json
+import os
+import platform
+import re
+import threading
+import time
+from src.laptop_repair.tools.command_cache import normalize_command
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".laptop_repair", "snapshots")
+
+# Commands whose output is a log: only lines not seen last time are interesting
+_LOG_PREFIXES = (
+    "dmesg",
+    "journalctl",
+    "powershell get-eventlog",
+)
+
+# Static inventory snapshots are reused without re-running for this long
+STATIC_SNAPSHOT_MAX_AGE = 7 * 24 * 60 * 60
+
+# Hardware that no diagnosis or fix changes. Longer-lived but not invariant outputs
+# (systeminfo's memory and boot time, the hotfix list, devices, partitions) are re-run.
+_INVARIANT_PREFIXES = (
+    "lscpu",
+    "lspci",
+    "wmic cpu",
+    "wmic memorychip",
+    "powershell get-wmiobject -class win32_physicalmemory",
+)
+
+# Unchanged outputs up to this many characters are repeated in full
+UNCHANGED_REPEAT_LIMIT = 1024
+
+# Numeric cells (memory, free space, CPU %) only count as changed beyond this ratio
+CHANGE_TOLERANCE = 0.1
+
+_CELL_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_CELL_RE = re.compile(r"^(\d+(?:\.\d+)?)([BKMGT]?)$")
+
+
+def _split_output(text: str):
+    """Split a tool result into its '--- Command Output' header and body."""
+    header, sep, body = text.partition("\n\n")
+    if not sep or not header.startswith("--- Command Output"):
+        return "", text
+    return header + "\n\n", body
+
+
+def _table_rows(body: str):
+    """Map first column -> full row for the record tables produced by the parsers/psutil collector."""
+    lines = body.splitlines()
+    if len(lines) < 2 or " | " not in lines[1]:
+        return None
+    rows = {}
+    for line in lines[2:]:
+        key = line.split(" | ", 1)[0]
+        # Several processes share a name; keep them apart by their row order
+        while key in rows:
+            key += "'"
+        rows[key] = line
+    return lines[1], rows
+
+
+def _cell_value(cell: str):
+    match = _CELL_RE.match(cell.strip())
+    if not match:
+        return None
+    return float(match.group(1)) * _CELL_UNITS[match.group(2)]
+
+
+def _row_changed(old_row: str, new_row: str) -> bool:
+    """True if a text cell differs or a numeric cell moved by more than CHANGE_TOLERANCE."""
+    old_cells, new_cells = old_row.split(" | "), new_row.split(" | ")
+    if len(old_cells) != len(new_cells):
+        return True
+    for old, new in zip(old_cells, new_cells):
+        if old == new:
+            continue
+        old_value, new_value = _cell_value(old), _cell_value(new)
+        if old_value is None or new_value is None:
+            return True
+        if abs(new_value - old_value) > CHANGE_TOLERANCE * max(abs(old_value), 1.0):
+            return True
+    return False
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.0f} s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f} min"
+    if seconds < 172800:
+        return f"{seconds / 3600:.1f} h"
+    return f"{seconds / 86400:.1f} days"
+
+
+class SnapshotStore:
+    """
+    Per-host store of the last output of every allowlisted command, used to hand
+    the agent a compact "what changed since last time" view on follow-up runs.
+    Every call of a run is compared with the snapshots loaded when the store was
+    created; the run's own outputs only become the baseline once save() is called.
+    """
+
+    def __init__(self, path: str = None, host: str = None):
+        if path is None:
+            path = os.getenv("LAPTOP_REPAIR_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR)
+        os.makedirs(path, exist_ok=True)
+        self.host = host or platform.node() or "localhost"
+        self.path = os.path.join(path, f"{self.host}.json")
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        # Outputs recorded during this run, written by save()
+        self._pending = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._snapshots = json.load(f)
+
+    def get(self, command: str):
+        return self._snapshots.get(normalize_command(command))
+
+    def reuse_static(self, command: str):
+        """Return the stored output of an invariant hardware command if it is recent enough, else None."""
+        if not normalize_command(command).startswith(_INVARIANT_PREFIXES):
+            return None
+        snapshot = self.get(command)
+        if snapshot is None or not snapshot["output"].startswith("--- Command Output"):
+            return None
+        age = time.time() - snapshot["taken_at"]
+        if age > STATIC_SNAPSHOT_MAX_AGE:
+            return None
+        header, body = _split_output(snapshot["output"])
+        return f"{header}(static inventory, from snapshot taken {_format_age(age)} ago)\n{body}"
+
+    def record(self, command: str, output: str) -> str:
+        """Keep `output` for save() and return what the agent should see: a delta if there is a previous snapshot."""
+        key = normalize_command(command)
+        now = time.time()
+        with self._lock:
+            previous = self._snapshots.get(key)
+            self._pending[key] = {"taken_at": now, "output": output}
+        if previous is None or output.startswith("Error"):
+            return output
+        return self.delta(command, previous, output, now - previous["taken_at"])
+
+    def delta(self, command: str, previous: dict, output: str, age: float) -> str:
+        header, body = _split_output(output)
+        _, old_body = _split_output(previous["output"])
+        since = f"since the snapshot taken {_format_age(age)} ago"
+        if body == old_body:
+            # Small outputs are cheap enough to repeat so the agent still has the values
+            if len(body) <= UNCHANGED_REPEAT_LIMIT:
+                return f"{header}(unchanged {since})\n{body}"
+            return f"{header}(unchanged {since})\n"
+
+        if normalize_command(command).startswith(_LOG_PREFIXES):
+            seen = set(old_body.splitlines())
+            new_lines = [line for line in body.splitlines() if line.strip() and line not in seen]
+            if not new_lines:
+                return f"{header}(no new entries {since})\n"
+            return f"{header}({len(new_lines)} new entries {since})\n" + "\n".join(new_lines) + "\n"
+
+        new_table, old_table = _table_rows(body), _table_rows(old_body)
+        if new_table is None or old_table is None or new_table[0] != old_table[0]:
+            return output
+        columns, rows = new_table
+        _, old_rows = old_table
+        added = [row for key, row in rows.items() if key not in old_rows]
+        removed = [row for key, row in old_rows.items() if key not in rows]
+        changed = [row for key, row in rows.items() if key in old_rows and _row_changed(old_rows[key], row)]
+        lines = [f"(changes {since}: {len(added)} new, {len(removed)} gone, {len(changed)} changed)", columns]
+        lines += [f"+ {row}" for row in added]
+        lines += [f"- {row}" for row in removed]
+        lines += [f"~ {row}" for row in changed]
+        return header + "\n".join(lines) + "\n"
+
+    def save(self):
+        """Make this run's outputs the baseline of the next run and write them to disk."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._snapshots.update(self._pending)
+            self._pending = {}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._snapshots, f)
+            os.replace(tmp_path, self.path)
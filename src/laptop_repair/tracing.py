@@ -0,0 +1,231 @@
+import atexit
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from src.laptop_repair.events import emit
+
+# Path of the trace file; '.json' writes Chrome trace format, anything else JSON lines.
+# Unset (the default) leaves every span a shared no-op object.
+TRACE_ENV = "LAPTOP_REPAIR_TRACE"
+
+_current = contextvars.ContextVar("laptop_repair_span", default=None)
+_span_ids = itertools.count(1)
+_tracer = None
+
+
+class Span:
+    """A timed unit of work; nested spans started in the same context become its children."""
+
+    __slots__ = ("tracer", "name", "category", "attrs", "span_id", "parent_id", "trace_id",
+                 "start", "wall_s", "cpu_s", "thread_id", "thread_name", "_wall_start", "_cpu_start", "_token")
+
+    def __init__(self, tracer, name: str, category: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.wall_s = None
+        self.cpu_s = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # CPU time of this thread only; a subprocess's own CPU is not included
+        self.cpu_s = time.thread_time() - self._cpu_start
+        self.wall_s = time.perf_counter() - self._wall_start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.write(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "category": self.category,
+            "start": self.start,
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "thread": self.thread_name,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Writes finished spans to a file as they complete, so a crashed run still leaves a trace."""
+
+    def __init__(self, path: str, fmt: str = None):
+        self.path = path
+        self.format = fmt or ("chrome" if path.endswith(".json") else "jsonl")
+        self._lock = threading.Lock()
+        self._named_threads = set()
+        self._pid = os.getpid()
+        if self.format == "chrome":
+            # Chrome's JSON array format allows the closing bracket to be missing
+            self._file = open(path, "w", encoding="utf-8")
+            self._file.write("[\n")
+        else:
+            self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, span: Span):
+        with self._lock:
+            if self._file is None:
+                return
+            if self.format == "chrome":
+                lines = self._chrome_events(span)
+            else:
+                lines = [json.dumps(span.to_dict(), default=str)]
+            for line in lines:
+                self._file.write(line + (",\n" if self.format == "chrome" else "\n"))
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _chrome_events(self, span: Span) -> list:
+        events = []
+        if span.thread_id not in self._named_threads:
+            self._named_threads.add(span.thread_id)
+            events.append(json.dumps({
+                "name": "thread_name", "ph": "M", "pid": self._pid, "tid": span.thread_id,
+                "args": {"name": span.thread_name},
+            }))
+        args = dict(span.attrs, cpu_ms=round(span.cpu_s * 1000, 3), span_id=span.span_id, parent_id=span.parent_id)
+        events.append(json.dumps({
+            "name": span.name, "cat": span.category, "ph": "X",
+            "ts": span.start * 1e6, "dur": span.wall_s * 1e6,
+            "pid": self._pid, "tid": span.thread_id, "args": args,
+        }, default=str))
+        return events
+
+
+def configure(path: str = None, fmt: str = None):
+    """Start writing spans to `path` ('jsonl' or 'chrome' format), or stop tracing when path is None."""
+    global _tracer
+    previous, _tracer = _tracer, (Tracer(path, fmt) if path else None)
+    if previous is not None:
+        previous.close()
+    return _tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, category: str = "app", **attrs):
+    """Context manager timing a block as a span; costs one global lookup when tracing is off."""
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP_SPAN
+    return Span(tracer, name, category, attrs)
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if tracing is on."""
+    if _tracer is None:
+        return
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def _usage_recorder_base():
+    try:
+        from litellm.integrations.custom_logger import CustomLogger
+        return CustomLogger
+    except ImportError:
+        return object
+
+
+def instrument_llm(llm):
+    """
+    Wrap `llm.call` so each request becomes an 'llm.call' span and an 'llm_call_finished'
+    event, both carrying the token counts crewai reports through its callbacks.
+    """
+    if getattr(llm, "_traced", False):
+        return llm
+
+    class UsageRecorder(_usage_recorder_base()):
+        def __init__(self):
+            super().__init__()
+            self.usage = {}
+
+        def log_success_event(self, kwargs, response_obj, start_time, end_time):
+            usage = response_obj.get("usage") if isinstance(response_obj, dict) else getattr(response_obj, "usage", None)
+            if usage is None:
+                return
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+                if value is not None:
+                    self.usage[key] = value
+
+    original_call = llm.call
+
+    def call(messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        model = getattr(llm, "model", None)
+        recorder = UsageRecorder()
+        started = time.perf_counter()
+        error = None
+        with span("llm.call", "llm", model=model) as current:
+            if not isinstance(messages, str):
+                current.set(messages=len(messages))
+            try:
+                result = original_call(messages, tools=tools, callbacks=list(callbacks or []) + [recorder],
+                                       available_functions=available_functions, **kwargs)
+                current.set(completion_chars=len(result) if isinstance(result, str) else None)
+                return result
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                current.set(**recorder.usage)
+                emit("llm_call_finished", model=model, elapsed_s=time.perf_counter() - started, error=error, **recorder.usage)
+
+    llm.call = call
+    llm._traced = True
+    return llm
+
+
+if os.getenv(TRACE_ENV):
+    configure(os.getenv(TRACE_ENV))
+    atexit.register(configure, None)
@@ -0,0 +1,134 @@
+import contextvars
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List
+from src.laptop_repair.events import emit
+from src.laptop_repair.tracing import span
+from src.laptop_repair.tools.custom_tool import _PREFETCH_EXCLUDED, OUTPUT_HEADER_RE, get_allowlist
+
+# Characters of each command's output passed to the agent; the tool has already
+# parsed the common commands into compact tables, so this mostly trims raw dumps
+DEFAULT_MAX_CHARS_PER_COMMAND = 1500
+
+_WORD_RE = re.compile(r"[a-z0-9'-]+")
+
+# A problem belongs to a category when one of its words starts with one of these stems
+CATEGORY_STEMS = {
+    "slow": ("slow", "sluggish", "lag", "freez", "hang", "stutter", "perform", "cpu", "memory", "ram", "unresponsive"),
+    "disk": ("disk", "drive", "storage", "ssd", "hdd", "space", "full", "chkdsk", "partition"),
+    "network": ("network", "internet", "wifi", "wi-fi", "wireless", "ethernet", "dns", "connect", "ping", "router"),
+    "battery": ("battery", "charg", "drain", "power", "overheat", "hot", "fan", "temperature"),
+    "boot": ("boot", "startup", "restart", "reboot", "bsod", "bluescreen", "crash", "shutdown", "update"),
+}
+
+# Problems that match no category still get a general health picture
+FALLBACK_CATEGORIES = ("slow",)
+
+_BUNDLES = {
+    "Windows": {
+        "baseline": ["systeminfo"],
+        "slow": [
+            "tasklist",
+            "wmic cpu get name,maxclockspeed,numberofcores",
+            "wmic computersystem get totalphysicalmemory",
+            "wmic startup get caption,command,location",
+            "wmic logicaldisk get size,freespace,caption",
+        ],
+        "disk": [
+            "wmic logicaldisk get size,freespace,caption",
+            "wmic diskdrive get status,size,model",
+            "dir %temp% /a",
+        ],
+        "network": ["ipconfig /all", "netstat -an"],
+        "battery": ["wmic temperature get currenttemperature"],
+        "boot": [
+            "bcdedit /enum",
+            "wmic startup get caption,command,location",
+            "wmic qfe list brief",
+            "powershell Get-EventLog -LogName System -EntryType Error -Newest 10",
+        ],
+    },
+    "Linux": {
+        "baseline": ["uname -a"],
+        "slow": ["top -bn1 | head -20", "free -h", "lscpu"],
+        "disk": ["df -h", "lsblk", "dmesg | tail -20"],
+        "network": ["ifconfig", "netstat -tuln"],
+        "battery": ["dmesg | tail -20", "journalctl -xe --no-pager -n 10"],
+        "boot": ["systemctl --failed", "journalctl -xe --no-pager -n 10", "dmesg | tail -20"],
+    },
+}
+
+
+@dataclass
+class TriageResult:
+    system: str
+    categories: List[str]
+    commands: List[str]
+    outputs: Dict[str, str] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+
+    def format_evidence(self, max_chars_per_command: int = DEFAULT_MAX_CHARS_PER_COMMAND) -> str:
+        """One section per command, in bundle order, each cut to `max_chars_per_command`."""
+        sections = [f"Triage categories: {', '.join(self.categories)} (system: {self.system})"]
+        for command in self.commands:
+            output = _condense(self.outputs.get(command, ""), max_chars_per_command)
+            sections.append(f"$ {command}\n{output}")
+        return "\n\n".join(sections)
+
+
+def _condense(output: str, max_chars: int) -> str:
+    # The evidence names each command itself and states the OS once
+    output = OUTPUT_HEADER_RE.sub("", output.strip())
+    if len(output) <= max_chars:
+        return output or "(no output)"
+    # Cut at a line boundary so tables are not left with half a row
+    cut = output.rfind("\n", 0, max_chars)
+    if cut <= 0:
+        cut = max_chars
+    return f"{output[:cut]}\n... [{len(output) - cut} more characters omitted]"
+
+
+def classify_problem(problem: str) -> List[str]:
+    """Categories whose keywords occur in the problem description, in CATEGORY_STEMS order."""
+    words = _WORD_RE.findall(problem.lower())
+    categories = [
+        category for category, stems in CATEGORY_STEMS.items()
+        if any(word.startswith(stems) for word in words)
+    ]
+    return categories or list(FALLBACK_CATEGORIES)
+
+
+def select_commands(categories, system: str) -> List[str]:
+    """
+    The baseline and category bundles for `system`, deduplicated and limited to its allowlist.
+    Like prefetching, triage runs before anyone asked, so commands too slow or with side
+    effects to start speculatively are left to the agent.
+    """
+    bundles = _BUNDLES.get(system, _BUNDLES["Linux"])
+    allowlist = get_allowlist(system)
+    commands = []
+    for category in ["baseline", *categories]:
+        for command in bundles.get(category, ()):
+            if command not in commands and command not in _PREFETCH_EXCLUDED and allowlist.is_allowed(command):
+                commands.append(command)
+    return commands
+
+
+def run_triage(problem: str, tool, max_workers: int = 6) -> TriageResult:
+    """
+    Run the command bundles for `problem` concurrently through `tool`, so they go through
+    the same allowlist, caches, prefetcher and cancellation as the agent's own calls.
+    """
+    categories = classify_problem(problem)
+    commands = select_commands(categories, tool.target_platform)
+    started = time.perf_counter()
+    with span("triage", "crew", categories=categories, commands=len(commands)):
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(commands))), thread_name_prefix="triage") as pool:
+            # Each command gets a copy of this context so its events and spans stay with the diagnosis
+            futures = {command: pool.submit(contextvars.copy_context().run, tool._run, command) for command in commands}
+            outputs = {command: future.result() for command, future in futures.items()}
+    result = TriageResult(tool.target_platform, categories, commands, outputs, time.perf_counter() - started)
+    emit("triage_finished", categories=categories, commands=commands, elapsed_s=result.elapsed_s)
+    return result